@@ -1,8 +1,11 @@
 import asyncio
+import functools
+import threading
 import time
 from enum import Enum
 from typing import Callable, Any, Optional
 from dataclasses import dataclass
+from .observability import get_logger
 
 class CircuitState(Enum):
     CLOSED = "closed"       # Normal operation
@@ -26,52 +29,91 @@ class CircuitBreaker:
         self.failure_count = 0
         self.success_count = 0
         self.last_failure_time = 0
+        # Guards state transitions only; counters are plain increments
+        self._state_lock = threading.Lock()
         self.logger = get_logger(f"circuit_breaker.{name}")
     
-    async def call(self, func: Callable, *args, **kwargs) -> Any:
-        """Execute function with circuit breaker protection"""
-        
+    def _transition(self, expected: CircuitState, new: CircuitState) -> bool:
+        """Compare-and-swap the state; True if this caller made the move"""
+        with self._state_lock:
+            if self.state is not expected:
+                return False
+            self.state = new
+            return True
+    
+    def _before_call(self) -> None:
+        """Reject while OPEN; move to HALF_OPEN once the recovery timeout passes"""
         if self.state == CircuitState.OPEN:
             if time.time() - self.last_failure_time < self.config.recovery_timeout:
                 raise CircuitBreakerOpenError(f"Circuit breaker {self.name} is OPEN")
-            else:
-                self.state = CircuitState.HALF_OPEN
+            elif self._transition(CircuitState.OPEN, CircuitState.HALF_OPEN):
                 self.success_count = 0
                 self.logger.info("circuit_breaker_half_open", name=self.name)
-        
+    
+    async def _guard(self, awaitable) -> Any:
+        """Await with timeout and record the outcome"""
         try:
-            # Execute with timeout
-            result = await asyncio.wait_for(
-                func(*args, **kwargs) if asyncio.iscoroutinefunction(func) else func(*args, **kwargs),
-                timeout=self.config.timeout
-            )
+            result = await asyncio.wait_for(awaitable, timeout=self.config.timeout)
             
             # Handle success
-            await self._on_success()
+            self._on_success()
             return result
             
         except Exception as e:
-            await self._on_failure(e)
+            self._on_failure(e)
             raise
     
-    async def _on_success(self):
+    async def call_async(self, func: Callable, *args, **kwargs) -> Any:
+        """Execute a coroutine function with circuit breaker protection"""
+        self._before_call()
+        return await self._guard(func(*args, **kwargs))
+    
+    async def call_sync(self, func: Callable, *args, **kwargs) -> Any:
+        """Execute a blocking function on the default executor with protection"""
+        self._before_call()
+        loop = asyncio.get_running_loop()
+        return await self._guard(loop.run_in_executor(None, functools.partial(func, *args, **kwargs)))
+    
+    def wrap(self, func: Callable) -> Callable:
+        """Bind func to the matching call variant once, at wrap time"""
+        variant = self.call_async if asyncio.iscoroutinefunction(func) else self.call_sync
+        
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            return await variant(func, *args, **kwargs)
+        return wrapper
+    
+    async def call(self, func: Callable, *args, **kwargs) -> Any:
+        """Execute function with circuit breaker protection
+        
+        Back-compat shim that dispatches per call; prefer call_async,
+        call_sync or wrap() when the kind of callable is known.
+        """
+        if asyncio.iscoroutinefunction(func):
+            return await self.call_async(func, *args, **kwargs)
+        return await self.call_sync(func, *args, **kwargs)
+    
+    def _on_success(self):
         """Handle successful call"""
         if self.state == CircuitState.HALF_OPEN:
             self.success_count += 1
-            if self.success_count >= self.config.success_threshold:
-                self.state = CircuitState.CLOSED
+            if (self.success_count >= self.config.success_threshold
+                    and self._transition(CircuitState.HALF_OPEN, CircuitState.CLOSED)):
                 self.failure_count = 0
                 self.logger.info("circuit_breaker_closed", name=self.name)
         elif self.state == CircuitState.CLOSED:
             self.failure_count = 0
     
-    async def _on_failure(self, exception: Exception):
+    def _on_failure(self, exception: Exception):
         """Handle failed call"""
         self.failure_count += 1
         self.last_failure_time = time.time()
         
-        if self.failure_count >= self.config.failure_threshold:
-            self.state = CircuitState.OPEN
+        # Only the caller that actually moves the state logs the opening
+        if self.failure_count >= self.config.failure_threshold and (
+            self._transition(CircuitState.CLOSED, CircuitState.OPEN)
+            or self._transition(CircuitState.HALF_OPEN, CircuitState.OPEN)
+        ):
             self.logger.error(
                 "circuit_breaker_opened", 
                 name=self.name, 
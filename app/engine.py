@@ -1,16 +1,45 @@
+import bisect
 import logging
 import time
-from typing import List, Dict, Any, Optional, Union
-from functools import lru_cache
-from dataclasses import dataclass, field
-from collections import deque
-from statistics import fmean
-from .eval_safe import safe_eval
-from .models import RuleModel
+from types import CodeType
+from typing import List, Dict, Any, Optional, Tuple, Union
+from dataclasses import dataclass
+from .eval_safe import compile_expression, safe_eval_compiled
+try:
+    from .proto_gen import rules_pb2
+except ImportError:  # proto files not generated
+    rules_pb2 = None
+from .models import RuleModel, proto_to_pydantic_rule
+from .redis_store import RULE_KEY_PATTERN, RULE_MGET_BATCH, RULE_SCAN_COUNT
 
 # Performance and monitoring
 logger = logging.getLogger(__name__)
 
+# Direct-mapped (expression, referenced ctx values) → result cache
+_EVAL_CACHE_SIZE = 4096  # must be a power of two
+_EVAL_CACHE_MASK = _EVAL_CACHE_SIZE - 1
+_MISSING = object()
+
+# health_check() snapshot lifetime; probes within the window share one scan
+_HEALTH_CACHE_TTL = 1.0
+
+# A loaded rule paired with its precompiled expression.  Evaluators only
+# ever read these pairs, so a rule and its code are swapped in together
+RuleEntry = Tuple[RuleModel, CodeType]
+
+def _routing_priority(entry: RuleEntry) -> int:
+    return entry[0].routing.priority
+
+def _without(rules: List[RuleModel], rule_id: str) -> List[RuleModel]:
+    return [r for r in rules if r.id != rule_id]
+
+def _entries_without(entries: List[RuleEntry], rule_id: str) -> List[RuleEntry]:
+    return [e for e in entries if e[0].id != rule_id]
+
+def _ctx_dict(ctx) -> dict:
+    """Namespace for rule expressions: the ctx itself if it is a dict, else its __dict__"""
+    return ctx if isinstance(ctx, dict) else ctx.__dict__
+
 @dataclass
 class RuleExecutionMetrics:
     """Track rule execution performance and failures"""
@@ -18,122 +47,291 @@ class RuleExecutionMetrics:
     execution_count: int = 0
     success_count: int = 0
     failure_count: int = 0
-    avg_execution_time: float = 0.0
-    _times: deque = field(default_factory=lambda: deque(maxlen=1000), repr=False)
+    total_time_ns: int = 0
     last_failure: Optional[str] = None
 
+    @property
+    def avg_execution_time(self) -> float:
+        """Mean execution time in seconds, computed on read"""
+        return self.total_time_ns / max(self.execution_count, 1) / 1e9
+
 class RuleEngine:
     def __init__(self):
         self.rules: List[RuleModel] = []
         self.metrics: Dict[str, RuleExecutionMetrics] = {}
-        self._expression_cache: Dict[str, bool] = {}
-        self._cache_max_size = 1000
+        # rule id → loaded rule; tells upsert()/remove() which lists hold it
+        self._rules_by_id: Dict[str, RuleModel] = {}
+        # One slot per hash bucket; a collision simply overwrites
+        self._eval_cache: List[Optional[tuple]] = [None] * _EVAL_CACHE_SIZE
+        # (rule, code) pairs partitioned by type (and routing by method).
+        # These lists are never mutated, only replaced, so an evaluation
+        # running on a worker thread always walks a complete snapshot
+        self._routing_rules: List[RuleEntry] = []
+        self._routing_by_method: Dict[str, List[RuleEntry]] = {}
+        self._fraud_rules: List[RuleEntry] = []
+        self._compliance_rules: List[RuleEntry] = []
+        self._business_rules: List[RuleEntry] = []
+        # (monotonic timestamp, snapshot) of the last health_check()
+        self._health_cache: tuple = (0.0, None)
     
     def load(self, objs: List[RuleModel]) -> None:
         """Runtime hot-reload with validation"""
-        valid_rules = []
+        entries = []
         for rule in objs:
             if rule.enabled:
-                # Pre-validate all expressions to catch errors early
-                if self._validate_rule_expressions(rule):
-                    valid_rules.append(rule)
+                # Compile all expressions up front to catch errors early
+                code = self._validate_rule_expressions(rule)
+                if code is not None:
+                    entries.append((rule, code))
+                    # Preallocate so the evaluation hot path never has to
+                    self.metrics.setdefault(rule.id, RuleExecutionMetrics(rule.id))
                 else:
-                    logger.error(f"Rule {rule.id} has invalid expressions, skipping")
+                    logger.error("Rule %s has invalid expressions, skipping", rule.id)
         
+        valid_rules = [rule for rule, _ in entries]
+        self._rules_by_id = {rule.id: rule for rule in valid_rules}
         self.rules = valid_rules
-        logger.info(f"Loaded {len(self.rules)} valid rules")
+        self._index_rules(entries)
+        logger.info("Loaded %d valid rules", len(self.rules))
+    
+    @classmethod
+    async def from_redis(cls, redis) -> "RuleEngine":
+        """New engine loaded with every rule stored in Redis"""
+        engine = cls()
+        await engine.load_from_redis(redis)
+        return engine
+    
+    async def load_from_redis(self, redis) -> None:
+        """Hot-reload from the serialized proto Rules under rule:*"""
+        if rules_pb2 is None:
+            raise ImportError("Proto classes not generated. Run: ./scripts/gen_protos.ps1 or ./scripts/gen_protos.sh")
+        
+        # Every value is a serialized Rule; one scratch message is reused
+        proto_rule = rules_pb2.Rule()
+        rules = []
+        keys = [
+            key
+            async for key in redis.scan_iter(match=RULE_KEY_PATTERN, count=RULE_SCAN_COUNT)
+        ]
+        # One MGET round trip per batch instead of a GET per key
+        for i in range(0, len(keys), RULE_MGET_BATCH):
+            batch = keys[i : i + RULE_MGET_BATCH]
+            for key, rule_data in zip(batch, await redis.mget(batch)):
+                if not rule_data:
+                    continue
+                
+                try:
+                    proto_rule.Clear()
+                    proto_rule.ParseFromString(rule_data)
+                    rules.append(proto_to_pydantic_rule(proto_rule))
+                except Exception as e:
+                    logger.warning("Failed to parse rule %r: %s", key, e)
+        
+        self.load(rules)
+    
+    def _index_rules(self, entries: List[RuleEntry]) -> None:
+        """Partition rules by type so each evaluator only walks its own rules"""
+        routing_by_method: Dict[str, List[RuleEntry]] = {}
+        # Stable sort (lower number = higher priority) keeps load order for ties
+        routing_rules = sorted(
+            (e for e in entries if e[0].routing), key=_routing_priority
+        )
+        for entry in routing_rules:
+            for m in set(entry[0].routing.methods):
+                routing_by_method.setdefault(m.value, []).append(entry)
+        self._routing_rules = routing_rules
+        self._routing_by_method = routing_by_method
+        self._fraud_rules = [e for e in entries if e[0].fraud]
+        self._compliance_rules = [e for e in entries if e[0].compliance]
+        self._business_rules = [e for e in entries if e[0].business]
+    
+    def upsert(self, rule: RuleModel) -> bool:
+        """Add or replace a single rule without recompiling the others
+        
+        Returns False (and leaves no version of the rule loaded) if the
+        rule is disabled or its expression is invalid.  The old version
+        stays visible until the lists holding the new one are published.
+        """
+        if not rule.enabled:
+            self.remove(rule.id)
+            return False
+        
+        code = self._validate_rule_expressions(rule)
+        if code is None:
+            logger.error("Rule %s has invalid expressions, skipping", rule.id)
+            self.remove(rule.id)
+            return False
+        
+        self.metrics.setdefault(rule.id, RuleExecutionMetrics(rule.id))
+        self._replace(rule.id, (rule, code))
+        logger.info("Upserted rule %s", rule.id)
+        return True
+    
+    def remove(self, rule_id: str) -> bool:
+        """Unload a single rule; False if it was not loaded"""
+        if rule_id not in self._rules_by_id:
+            return False
+        self._replace(rule_id, None)
+        return True
     
-    def _validate_rule_expressions(self, rule: RuleModel) -> bool:
-        """Pre-validate all expressions in a rule"""
+    def _replace(self, rule_id: str, entry: Optional[RuleEntry]) -> None:
+        """Swap rule_id's loaded version for entry (None unloads it)
+        
+        Every affected list is rebuilt off to the side and then assigned,
+        so evaluations see either the old or the new version of the rule,
+        never neither.  The by-id lookup tells which per-type list (and
+        method buckets) hold the old version, so only those are rebuilt.
+        """
+        old = self._rules_by_id.get(rule_id)
+        rules = self.rules
+        routing_rules = self._routing_rules
+        routing_by_method = self._routing_by_method
+        fraud_rules = self._fraud_rules
+        compliance_rules = self._compliance_rules
+        business_rules = self._business_rules
+        
+        if old is not None:
+            rules = _without(rules, rule_id)
+            if old.routing:
+                routing_rules = _entries_without(routing_rules, rule_id)
+                routing_by_method = dict(routing_by_method)
+                for m in set(old.routing.methods):
+                    routing_by_method[m.value] = _entries_without(routing_by_method[m.value], rule_id)
+            elif old.fraud:
+                fraud_rules = _entries_without(fraud_rules, rule_id)
+            elif old.compliance:
+                compliance_rules = _entries_without(compliance_rules, rule_id)
+            elif old.business:
+                business_rules = _entries_without(business_rules, rule_id)
+        
+        if entry is not None:
+            rule = entry[0]
+            rules = rules + [rule]
+            if rule.routing:
+                routing_rules = list(routing_rules)
+                bisect.insort(routing_rules, entry, key=_routing_priority)
+                routing_by_method = dict(routing_by_method)
+                for m in set(rule.routing.methods):
+                    bucket = list(routing_by_method.get(m.value, ()))
+                    bisect.insort(bucket, entry, key=_routing_priority)
+                    routing_by_method[m.value] = bucket
+            elif rule.fraud:
+                fraud_rules = fraud_rules + [entry]
+            elif rule.compliance:
+                compliance_rules = compliance_rules + [entry]
+            elif rule.business:
+                business_rules = business_rules + [entry]
+            self._rules_by_id[rule_id] = rule
+        else:
+            del self._rules_by_id[rule_id]
+        
+        # Publish
+        self._routing_rules = routing_rules
+        self._routing_by_method = routing_by_method
+        self._fraud_rules = fraud_rules
+        self._compliance_rules = compliance_rules
+        self._business_rules = business_rules
+        self.rules = rules
+    
+    def _validate_rule_expressions(self, rule: RuleModel) -> Optional[CodeType]:
+        """Compile the rule's expression; None if it is invalid"""
         try:
-            test_ctx = {"amount": 100, "method": "CARD", "destination_country": "US"}
-            
             if rule.routing:
-                safe_eval(rule.routing.match, test_ctx)
+                return compile_expression(rule.routing.match)
             elif rule.fraud:
-                safe_eval(rule.fraud.expression, test_ctx)
+                return compile_expression(rule.fraud.expression)
             elif rule.compliance:
-                safe_eval(rule.compliance.expression, test_ctx)
+                return compile_expression(rule.compliance.expression)
             elif rule.business:
-                safe_eval(rule.business.condition, test_ctx)
+                return compile_expression(rule.business.condition)
             
-            return True
+            return None
         except Exception as e:
-            logger.error(f"Expression validation failed for rule {rule.id}: {e}")
-            return False
-    
-    @lru_cache(maxsize=1000)
-    def _cached_eval(self, expression: str, ctx_dict: tuple) -> bool:
-        """expression + frozen ctx tuple → bool"""
-        return safe_eval(expression, dict(ctx_dict))
+            logger.error("Expression validation failed for rule %s: %s", rule.id, e)
+            return None
     
-    def _safe_eval_with_metrics(self, expression: str, ctx: dict, rule_id: str) -> bool:
-        """Evaluate expression with error handling and metrics"""
-        start_time = time.time()
+    def _safe_eval_with_metrics(self, code: CodeType, ctx: dict, rule_id: str) -> bool:
+        """Evaluate a precompiled expression with error handling and metrics"""
+        start_ns = time.perf_counter_ns()
         
         try:
-            # Create hashable context for caching
-            ctx_items = tuple(sorted(ctx.items()))
-
-            result = self._cached_eval(expression, ctx_items)
+            result = self._cached_eval(code, ctx)
             
             # Update metrics
-            self._update_metrics(rule_id, True, time.time() - start_time)
+            self._update_metrics(rule_id, True, time.perf_counter_ns() - start_ns)
             return result
             
         except Exception as e:
-            self._update_metrics(rule_id, False, time.time() - start_time, str(e))
-            logger.warning(f"Expression evaluation failed for rule {rule_id}: {e}")
+            self._update_metrics(rule_id, False, time.perf_counter_ns() - start_ns, type(e).__name__)
+            logger.warning("Expression evaluation failed for rule %s: %s", rule_id, e)
             return False
     
-    def _update_metrics(self, rule_id: str, success: bool, execution_time: float, error: Optional[str] = None):
-        """Update rule execution metrics"""
-        if rule_id not in self.metrics:
-            self.metrics[rule_id] = RuleExecutionMetrics(rule_id)
+    def _cached_eval(self, code: CodeType, ctx: dict) -> bool:
+        """Evaluate code against ctx through the direct-mapped result cache
         
+        Rule expressions are pure, so the result depends only on the values
+        of the names the code references (code.co_names).  The slot keeps
+        the code object and those values as its tag, so a hit is exact.
+        """
+        try:
+            values = tuple([ctx.get(name, _MISSING) for name in code.co_names])
+            slot = hash((id(code), values)) & _EVAL_CACHE_MASK
+        except TypeError:  # unhashable context value
+            return safe_eval_compiled(code, ctx)
+        
+        entry = self._eval_cache[slot]
+        if entry is not None and entry[0] is code and entry[1] == values:
+            return entry[2]
+        
+        result = safe_eval_compiled(code, ctx)
+        self._eval_cache[slot] = (code, values, result)
+        return result
+    
+    def _update_metrics(self, rule_id: str, success: bool, execution_time_ns: int, error: Optional[str] = None):
+        """Update rule execution metrics (entry preallocated in load())"""
         metric = self.metrics[rule_id]
         metric.execution_count += 1
+        metric.total_time_ns += execution_time_ns
         
         if success:
             metric.success_count += 1
         else:
             metric.failure_count += 1
             metric.last_failure = error
-        
-        metric._times.append(execution_time)
-        metric.avg_execution_time = fmean(metric._times)
     
-    def route(self, ctx) -> Optional[List[str]]:
-        """Routing with improved load balancing and error handling"""
-        candidates = []
+    def route(self, ctx, return_all: bool = False) -> Optional[List[str]]:
+        """Routing with improved load balancing and error handling
         
-        for rule in self.rules:
-            if not rule.routing:
-                continue
-                
-            # Check if method is supported
-            if hasattr(ctx, 'method') and ctx.method not in rule.routing.methods:
-                continue
-            
-            # Evaluate routing condition
-            if self._safe_eval_with_metrics(rule.routing.match, ctx.__dict__, rule.id):
-                candidates.append(rule.routing)
-        
-        if not candidates:
-            logger.info("No routing rules matched")
-            return None
+        Rules are pre-sorted by priority, so the first match is the winner.
+        With return_all=True every matching rule's processors are returned,
+        highest priority first.
+        """
+        ctx_dict = _ctx_dict(ctx)
+        method = ctx_dict.get('method')
         
-        # Sort by priority (lower number = higher priority)
-        candidates.sort(key=lambda r: r.priority)
-        
-        # Use highest priority rule
-        selected_rule = candidates[0]
+        # Only rules supporting the transaction's method are candidates
+        if method is None:
+            rules = self._routing_rules
+        else:
+            rules = self._routing_by_method.get(method, ())
         
         # Weight is a probability per rule, not per processor.  Using the
         # selected rule's processors in declared order keeps priority logic
         # simple.  More complex balancing would track processor-specific
         # weights in a separate structure.
-        return list(selected_rule.processors)
+        processors = []
+        for rule, code in rules:
+            # Evaluate routing condition
+            if self._safe_eval_with_metrics(code, ctx_dict, rule.id):
+                if not return_all:
+                    return list(rule.routing.processors)
+                processors.extend(rule.routing.processors)
+        
+        if not processors:
+            logger.info("No routing rules matched")
+            return None
+        
+        return processors
     
     def fraud(self, ctx) -> Dict[str, Any]:
         """Improved fraud detection with per-rule thresholds"""
@@ -142,13 +340,11 @@ class RuleEngine:
         action_priority = {"ALLOW": 0, "REVIEW": 1, "BLOCK": 2}
         
         matched_rules = []
+        ctx_dict = _ctx_dict(ctx)
         
-        for rule in self.rules:
-            if not rule.fraud:
-                continue
-            
+        for rule, code in self._fraud_rules:
             # Evaluate fraud condition
-            if self._safe_eval_with_metrics(rule.fraud.expression, ctx.__dict__, rule.id):
+            if self._safe_eval_with_metrics(code, ctx_dict, rule.id):
                 rule_score = rule.fraud.score_weight
                 total_score += rule_score
                 
@@ -175,13 +371,11 @@ class RuleEngine:
         """Enhanced compliance checking with mandatory rule handling"""
         results = {}
         mandatory_failures = []
+        ctx_dict = _ctx_dict(ctx)
         
-        for rule in self.rules:
-            if not rule.compliance:
-                continue
-            
+        for rule, code in self._compliance_rules:
             # Evaluate compliance condition
-            result = self._safe_eval_with_metrics(rule.compliance.expression, ctx.__dict__, rule.id)
+            result = self._safe_eval_with_metrics(code, ctx_dict, rule.id)
             
             results[rule.compliance.name] = {
                 "passed": result,
@@ -202,13 +396,11 @@ class RuleEngine:
     def business(self, ctx) -> List[Dict[str, Any]]:
         """Enhanced business rule evaluation with action details"""
         actions = []
+        ctx_dict = _ctx_dict(ctx)
         
-        for rule in self.rules:
-            if not rule.business:
-                continue
-            
+        for rule, code in self._business_rules:
             # Evaluate business condition
-            if self._safe_eval_with_metrics(rule.business.condition, ctx.__dict__, rule.id):
+            if self._safe_eval_with_metrics(code, ctx_dict, rule.id):
                 actions.append({
                     "rule_id": rule.id,
                     "rule_name": rule.business.name,
@@ -219,26 +411,70 @@ class RuleEngine:
         
         return actions
     
+    def evaluate_all(self, ctx) -> Tuple[Optional[List[str]], Dict[str, Any], Dict[str, Any], List[Dict[str, Any]]]:
+        """Run routing, fraud, compliance and business evaluation in one call
+        
+        The context namespace is resolved once and every evaluator walks
+        only its own pre-partitioned list, so each loaded rule is visited
+        exactly once.  Returns (route, fraud, compliance, business).
+        """
+        ctx_dict = _ctx_dict(ctx)
+        return (
+            self.route(ctx_dict),
+            self.fraud(ctx_dict),
+            self.compliance(ctx_dict),
+            self.business(ctx_dict)
+        )
+    
+    def rule_counts(self) -> Dict[str, int]:
+        """Loaded rule counts by type, read off the partitioned lists in O(1)
+        
+        Only enabled rules are ever loaded, so "enabled" equals "total".
+        """
+        total = len(self.rules)
+        return {
+            "total": total,
+            "routing": len(self._routing_rules),
+            "fraud": len(self._fraud_rules),
+            "compliance": len(self._compliance_rules),
+            "business": len(self._business_rules),
+            "enabled": total
+        }
+    
     def get_metrics(self) -> Dict[str, RuleExecutionMetrics]:
         """Get rule execution metrics for monitoring"""
         return self.metrics.copy()
     
     def clear_cache(self) -> None:
         """Clear expression evaluation cache"""
-        self._cached_eval.cache_clear()
+        compile_expression.cache_clear()
+        self._eval_cache = [None] * _EVAL_CACHE_SIZE
         logger.info("Expression cache cleared")
     
     def health_check(self) -> Dict[str, Any]:
-        """Engine health check for monitoring"""
+        """Engine health check for monitoring
+        
+        The snapshot sums over every rule's metrics and scans the eval
+        cache, so it is reused for _HEALTH_CACHE_TTL seconds to keep probe
+        storms cheap.
+        """
+        now = time.monotonic()
+        cached_at, snapshot = self._health_cache
+        if snapshot is not None and now - cached_at < _HEALTH_CACHE_TTL:
+            return snapshot
+        
         total_rules = len(self.rules)
         total_executions = sum(m.execution_count for m in self.metrics.values())
         total_failures = sum(m.failure_count for m in self.metrics.values())
         
-        return {
+        snapshot = {
             "status": "healthy",
             "total_rules": total_rules,
             "total_executions": total_executions,
             "total_failures": total_failures,
             "failure_rate": total_failures / max(total_executions, 1),
-            "cache_info": self._cached_eval.cache_info()._asdict()
+            "cache_size": compile_expression.cache_info().currsize,
+            "eval_cache_used": _EVAL_CACHE_SIZE - self._eval_cache.count(None)
         }
+        self._health_cache = (now, snapshot)
+        return snapshot
@@ -1,27 +1,6 @@
 import ast
-from evalidate import Expr, base_eval_model, EvalException
-
-SAFE = base_eval_model.clone()
-
-# deny ALL functions / attributes depending on evalidate version
-if hasattr(SAFE, "funcs"):
-    SAFE.funcs.clear()
-    SAFE.names.clear()
-    if hasattr(SAFE, "allowed_nodes"):
-        SAFE.allowed_nodes.update({
-            "Expression", "BoolOp", "BinOp", "UnaryOp", "Compare",
-            "Name", "Load", "Constant",
-            "And", "Or", "Not", "Eq", "NotEq", "Lt", "LtE", "Gt", "GtE",
-        })
-else:
-    SAFE.allowed_functions = []
-    SAFE.imported_functions = {}
-    SAFE.attributes = []
-    SAFE.nodes = [
-        "Expression", "BoolOp", "BinOp", "UnaryOp", "Compare", "Name", "Load",
-        "Constant", "And", "Or", "Not", "Eq", "NotEq", "Lt", "LtE", "Gt", "GtE",
-    ]
-
+from functools import lru_cache
+from types import CodeType
 
 ALLOWED = (
     ast.Expression, ast.BoolOp, ast.BinOp, ast.UnaryOp, ast.Compare,
@@ -29,22 +8,33 @@ ALLOWED = (
     ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE,
 )
 
-_AST_CACHE: dict[str, ast.AST] = {}
+# No builtins are reachable from a rule expression
+_NO_BUILTINS = {"__builtins__": {}}
+
+# Loaded rules keep their own code objects, so this only saves recompiling
+# repeated expressions; evicting an entry never breaks a live rule
+_CODE_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=_CODE_CACHE_SIZE)
+def compile_expression(expr: str) -> CodeType:
+    """Parse, whitelist-check & compile once; cache the code object."""
+    tree = ast.parse(expr, mode="eval")
+    for n in ast.walk(tree):
+        if not isinstance(n, ALLOWED):
+            raise ValueError(f"Disallowed node {type(n).__name__}")
+    ast.fix_missing_locations(tree)
+    return compile(tree, "<rule>", "eval")
 
+def safe_eval_compiled(code: CodeType, ctx: dict) -> bool:
+    """Run a code object from compile_expression() against ctx.
 
-def _compile(expr: str) -> ast.AST:
-    """Parse once & cache the tree."""
-    if expr not in _AST_CACHE:
-        tree = ast.parse(expr, mode="eval")
-        for n in ast.walk(tree):
-            if not isinstance(n, ALLOWED):
-                raise ValueError(f"Disallowed node {type(n).__name__}")
-        _AST_CACHE[expr] = tree
-    return _AST_CACHE[expr]
+    ctx is used as the locals mapping as-is, without a copy: the whitelist
+    admits no Assign/AugAssign/NamedExpr, so an expression cannot write to it.
+    Errors such as a missing context name propagate to the caller, which
+    records them as rule failures.
+    """
+    return bool(eval(code, _NO_BUILTINS, ctx))
 
 def safe_eval(expr: str, ctx: dict) -> bool:
-    tree = _compile(expr)
-    try:
-        return bool(Expr(tree, model=SAFE).eval(ctx))
-    except EvalException:
-        return False
+    return safe_eval_compiled(compile_expression(expr), ctx)
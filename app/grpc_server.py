@@ -2,7 +2,10 @@ import grpc
 import asyncio
 import json
 import logging
-from typing import Optional
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import List, Optional
 try:
     from .proto_gen import rules_pb2, rules_pb2_grpc
 except ImportError:  # proto files not generated
@@ -18,16 +21,108 @@ except ImportError:  # proto files not generated
     )
 from .models import RuleModel, proto_to_pydantic_rule, pydantic_to_proto_rule, create_proto_response
 from .engine import RuleEngine
+from .redis_store import RULE_KEY_PATTERN, rule_redis_key
 
 logger = logging.getLogger(__name__)
 
+# Direct-mapped cache of parsed rules, one entry per slot
+_PROTO_CACHE_SIZE = 1024  # must be a power of two
+_PROTO_CACHE_MASK = _PROTO_CACHE_SIZE - 1
+
+_ALL_RULE_TYPES = frozenset({"routing", "fraud", "compliance", "business"})
+
+# str() of small counts, reused for result metadata
+_SMALL_INT_STR = tuple(str(i) for i in range(101))
+
+def _count_str(n: int) -> str:
+    return _SMALL_INT_STR[n] if n <= 100 else str(n)
+
+def _error_response(message: str, field: str, code: str, error_message: str):
+    """Failed RuleResponse with a single validation error, built in place"""
+    response = rules_pb2.RuleResponse()
+    response.success = False
+    response.message = message
+    error = response.errors.add()
+    error.field = field
+    error.message = error_message
+    error.code = code
+    return response
+
+def _parse_rules(rule_datas: List[bytes]) -> list:
+    """Parse serialized rules (run on the parse pool, off the event loop)"""
+    parsed = []
+    for rule_data in rule_datas:
+        proto_rule = rules_pb2.Rule()
+        proto_rule.ParseFromString(rule_data)
+        parsed.append(proto_rule)
+    return parsed
+
 # Define RuleService class - always available
 class RuleService(rules_pb2_grpc.RuleServiceServicer if rules_pb2 is not None else object):
     def __init__(self, engine: RuleEngine, redis):
         self.engine = engine
         self.redis = redis
+        self._parse_workers = min(8, os.cpu_count() or 1)
+        self._parse_pool = ThreadPoolExecutor(
+            max_workers=self._parse_workers, thread_name_prefix="rule-parse"
+        )
+        # slot → (rule_key, serialized bytes, parsed rule)
+        self._proto_cache: List[Optional[tuple]] = [None] * _PROTO_CACHE_SIZE
         logger.info("RuleService initialized")
 
+    def _cache_lookup(self, rule_key: bytes, rule_data: bytes):
+        """Parsed rule for rule_key if cached for exactly these bytes"""
+        entry = self._proto_cache[hash(rule_key) & _PROTO_CACHE_MASK]
+        if entry is not None and entry[0] == rule_key and entry[1] == rule_data:
+            return entry[2]
+        return None
+
+    def _cache_store(self, rule_key: bytes, rule_data: bytes, proto_rule) -> None:
+        self._proto_cache[hash(rule_key) & _PROTO_CACHE_MASK] = (rule_key, rule_data, proto_rule)
+
+    def _cache_invalidate(self, rule_key: bytes) -> None:
+        slot = hash(rule_key) & _PROTO_CACHE_MASK
+        entry = self._proto_cache[slot]
+        if entry is not None and entry[0] == rule_key:
+            self._proto_cache[slot] = None
+
+    def _parse_cached(self, rule_key: bytes, rule_data: bytes):
+        """Parse a stored rule, reusing the cached message when the bytes match"""
+        proto_rule = self._cache_lookup(rule_key, rule_data)
+        if proto_rule is None:
+            proto_rule = rules_pb2.Rule()
+            proto_rule.ParseFromString(rule_data)
+            self._cache_store(rule_key, rule_data, proto_rule)
+        return proto_rule
+
+    async def _parse_batch(self, rule_keys: List[bytes], rule_datas: List[Optional[bytes]]) -> list:
+        """Parse rules, serving cache hits inline and parsing misses on the
+        thread pool, one chunk per worker. Order follows rule_keys."""
+        results = []
+        miss_idx, miss_keys, miss_datas = [], [], []
+        for rule_key, rule_data in zip(rule_keys, rule_datas):
+            if not rule_data:
+                continue
+            proto_rule = self._cache_lookup(rule_key, rule_data)
+            if proto_rule is None:
+                miss_idx.append(len(results))
+                miss_keys.append(rule_key)
+                miss_datas.append(rule_data)
+            results.append(proto_rule)
+        
+        if miss_datas:
+            loop = asyncio.get_running_loop()
+            chunk = -(-len(miss_datas) // self._parse_workers)
+            parsed = await asyncio.gather(*(
+                loop.run_in_executor(self._parse_pool, _parse_rules, miss_datas[i:i + chunk])
+                for i in range(0, len(miss_datas), chunk)
+            ))
+            flat = [proto_rule for batch in parsed for proto_rule in batch]
+            for idx, rule_key, rule_data, proto_rule in zip(miss_idx, miss_keys, miss_datas, flat):
+                self._cache_store(rule_key, rule_data, proto_rule)
+                results[idx] = proto_rule
+        return results
+
     async def CreateRule(self, request, context):
         """Create a new rule"""
         if rules_pb2 is None:
@@ -40,19 +135,22 @@ class RuleService(rules_pb2_grpc.RuleServiceServicer if rules_pb2 is not None el
             
             # Validate the rule
             if not pydantic_rule.id:
-                return create_proto_response(
-                    success=False,
-                    message="Rule ID is required",
-                    errors=[{"field": "id", "message": "Rule ID cannot be empty", "code": "REQUIRED_FIELD"}]
+                return _error_response(
+                    "Rule ID is required",
+                    field="id",
+                    code="REQUIRED_FIELD",
+                    error_message="Rule ID cannot be empty",
                 )
             
-            # Store in Redis
-            rule_key = f"rule:{pydantic_rule.id}"
-            await self.redis.set(rule_key, request.rule.SerializeToString())
+            pydantic_rule.last_modified = datetime.now()
+            
+            # Store in Redis, including the last_modified stamp
+            rule_key = rule_redis_key(pydantic_rule.id)
+            await self.redis.set(rule_key, pydantic_to_proto_rule(pydantic_rule).SerializeToString())
+            self._cache_invalidate(rule_key)
             
             # Update engine with new rule
-            updated_rules = [pydantic_rule] + [r for r in self.engine.rules if r.id != pydantic_rule.id]
-            self.engine.load(updated_rules)
+            self.engine.upsert(pydantic_rule)
             
             logger.info(f"Created rule {pydantic_rule.id}")
             return create_proto_response(
@@ -63,10 +161,11 @@ class RuleService(rules_pb2_grpc.RuleServiceServicer if rules_pb2 is not None el
             
         except Exception as e:
             logger.error(f"CreateRule failed: {e}")
-            return create_proto_response(
-                success=False,
-                message=f"Failed to create rule: {str(e)}",
-                errors=[{"field": "general", "message": str(e), "code": "INTERNAL_ERROR"}]
+            return _error_response(
+                f"Failed to create rule: {str(e)}",
+                field="general",
+                code="INTERNAL_ERROR",
+                error_message=str(e),
             )
 
     async def UpdateRule(self, request, context):
@@ -80,25 +179,27 @@ class RuleService(rules_pb2_grpc.RuleServiceServicer if rules_pb2 is not None el
             pydantic_rule = proto_to_pydantic_rule(request.rule)
             
             # Verify rule exists
-            rule_key = f"rule:{request.rule_id}"
+            rule_key = rule_redis_key(request.rule_id)
             existing_rule = await self.redis.get(rule_key)
             if not existing_rule:
-                return create_proto_response(
-                    success=False,
-                    message=f"Rule {request.rule_id} not found",
-                    errors=[{"field": "rule_id", "message": "Rule does not exist", "code": "NOT_FOUND"}]
+                return _error_response(
+                    f"Rule {request.rule_id} not found",
+                    field="rule_id",
+                    code="NOT_FOUND",
+                    error_message="Rule does not exist",
                 )
             
-            # Update the rule ID to match the request
+            # Update the rule ID to match the request and stamp the edit
             pydantic_rule.id = request.rule_id
+            pydantic_rule.last_modified = datetime.now()
             
             # Store updated rule in Redis
             updated_proto = pydantic_to_proto_rule(pydantic_rule)
             await self.redis.set(rule_key, updated_proto.SerializeToString())
+            self._cache_invalidate(rule_key)
             
             # Update engine
-            updated_rules = [pydantic_rule] + [r for r in self.engine.rules if r.id != request.rule_id]
-            self.engine.load(updated_rules)
+            self.engine.upsert(pydantic_rule)
             
             logger.info(f"Updated rule {request.rule_id}")
             return create_proto_response(
@@ -109,10 +210,11 @@ class RuleService(rules_pb2_grpc.RuleServiceServicer if rules_pb2 is not None el
             
         except Exception as e:
             logger.error(f"UpdateRule failed: {e}")
-            return create_proto_response(
-                success=False,
-                message=f"Failed to update rule: {str(e)}",
-                errors=[{"field": "general", "message": str(e), "code": "INTERNAL_ERROR"}]
+            return _error_response(
+                f"Failed to update rule: {str(e)}",
+                field="general",
+                code="INTERNAL_ERROR",
+                error_message=str(e),
             )
 
     async def GetRule(self, request, context):
@@ -122,19 +224,19 @@ class RuleService(rules_pb2_grpc.RuleServiceServicer if rules_pb2 is not None el
             return None
             
         try:
-            rule_key = f"rule:{request.rule_id}"
+            rule_key = rule_redis_key(request.rule_id)
             rule_data = await self.redis.get(rule_key)
             
             if not rule_data:
-                return create_proto_response(
-                    success=False,
-                    message=f"Rule {request.rule_id} not found",
-                    errors=[{"field": "rule_id", "message": "Rule does not exist", "code": "NOT_FOUND"}]
+                return _error_response(
+                    f"Rule {request.rule_id} not found",
+                    field="rule_id",
+                    code="NOT_FOUND",
+                    error_message="Rule does not exist",
                 )
             
             # Parse the proto rule
-            proto_rule = rules_pb2.Rule()
-            proto_rule.ParseFromString(rule_data)
+            proto_rule = self._parse_cached(rule_key, rule_data)
             
             # Convert to Pydantic for response
             pydantic_rule = proto_to_pydantic_rule(proto_rule)
@@ -148,10 +250,11 @@ class RuleService(rules_pb2_grpc.RuleServiceServicer if rules_pb2 is not None el
             
         except Exception as e:
             logger.error(f"GetRule failed: {e}")
-            return create_proto_response(
-                success=False,
-                message=f"Failed to get rule: {str(e)}",
-                errors=[{"field": "general", "message": str(e), "code": "INTERNAL_ERROR"}]
+            return _error_response(
+                f"Failed to get rule: {str(e)}",
+                field="general",
+                code="INTERNAL_ERROR",
+                error_message=str(e),
             )
 
     async def ListRules(self, request, context):
@@ -163,28 +266,26 @@ class RuleService(rules_pb2_grpc.RuleServiceServicer if rules_pb2 is not None el
         try:
             # Get all rule keys from Redis
             rule_keys = []
-            async for key in self.redis.scan_iter(match="rule:*"):
+            async for key in self.redis.scan_iter(match=RULE_KEY_PATTERN):
                 rule_keys.append(key)
             
+            # Fetch all rules in one round-trip
+            rule_datas = await self.redis.mget(rule_keys) if rule_keys else []
+
             # Apply filtering
             filtered_rules = []
-            for key in rule_keys:
-                rule_data = await self.redis.get(key)
-                if rule_data:
-                    proto_rule = rules_pb2.Rule()
-                    proto_rule.ParseFromString(rule_data)
-                    
-                    # Apply enabled filter if requested
-                    if request.enabled_only and not proto_rule.enabled:
+            for proto_rule in await self._parse_batch(rule_keys, rule_datas):
+                # Apply enabled filter if requested
+                if request.enabled_only and not proto_rule.enabled:
+                    continue
+                
+                # Add basic text filtering if filter is provided
+                if request.filter:
+                    rule_text = f"{proto_rule.id} {proto_rule.description}".lower()
+                    if request.filter.lower() not in rule_text:
                         continue
-                    
-                    # Add basic text filtering if filter is provided
-                    if request.filter:
-                        rule_text = f"{proto_rule.id} {proto_rule.description}".lower()
-                        if request.filter.lower() not in rule_text:
-                            continue
-                    
-                    filtered_rules.append(proto_rule)
+                
+                filtered_rules.append(proto_rule)
             
             # Apply pagination
             page = max(1, request.page) if request.page else 1
@@ -220,23 +321,24 @@ class RuleService(rules_pb2_grpc.RuleServiceServicer if rules_pb2 is not None el
             return None
             
         try:
-            rule_key = f"rule:{request.rule_id}"
+            rule_key = rule_redis_key(request.rule_id)
             
             # Check if rule exists
             existing_rule = await self.redis.get(rule_key)
             if not existing_rule:
-                return create_proto_response(
-                    success=False,
-                    message=f"Rule {request.rule_id} not found",
-                    errors=[{"field": "rule_id", "message": "Rule does not exist", "code": "NOT_FOUND"}]
+                return _error_response(
+                    f"Rule {request.rule_id} not found",
+                    field="rule_id",
+                    code="NOT_FOUND",
+                    error_message="Rule does not exist",
                 )
             
             # Delete from Redis
             await self.redis.delete(rule_key)
+            self._cache_invalidate(rule_key)
             
             # Update engine (remove the rule)
-            updated_rules = [r for r in self.engine.rules if r.id != request.rule_id]
-            self.engine.load(updated_rules)
+            self.engine.remove(request.rule_id)
             
             logger.info(f"Deleted rule {request.rule_id}")
             return create_proto_response(
@@ -246,10 +348,11 @@ class RuleService(rules_pb2_grpc.RuleServiceServicer if rules_pb2 is not None el
             
         except Exception as e:
             logger.error(f"DeleteRule failed: {e}")
-            return create_proto_response(
-                success=False,
-                message=f"Failed to delete rule: {str(e)}",
-                errors=[{"field": "general", "message": str(e), "code": "INTERNAL_ERROR"}]
+            return _error_response(
+                f"Failed to delete rule: {str(e)}",
+                field="general",
+                code="INTERNAL_ERROR",
+                error_message=str(e),
             )
 
     async def EvaluateRules(self, request, context):
@@ -259,69 +362,59 @@ class RuleService(rules_pb2_grpc.RuleServiceServicer if rules_pb2 is not None el
             return None
             
         try:
-            # Convert context map to dict
-            ctx_dict = dict(request.context)
-            
-            # Create a simple context object
-            class SimpleContext:
-                def __init__(self, data):
-                    self.__dict__.update(data)
-            
-            ctx = SimpleContext(ctx_dict)
-            
-            # Evaluate rules based on requested types
-            results = []
-            requested_types = set(request.rule_types) if request.rule_types else {"routing", "fraud", "compliance", "business"}
+            # Convert context map to dict; the engine evaluates mappings
+            # directly, so every rule type shares this one object
+            ctx = dict(request.context)
+
+            # Results are added straight onto the response message
+            response = rules_pb2.EvaluateRulesResponse()
+            results = response.results
+            requested_types = set(request.rule_types) if request.rule_types else _ALL_RULE_TYPES
             
             if "routing" in requested_types:
                 routing_result = self.engine.route(ctx)
                 if routing_result:
                     for processor in routing_result:
-                        result = rules_pb2.RuleEvaluationResult()
+                        result = results.add()
                         result.rule_id = "routing"
                         result.rule_name = "Routing Decision"
                         result.matched = True
                         result.action = processor
                         result.metadata["processor"] = processor
-                        results.append(result)
             
             if "fraud" in requested_types:
                 fraud_result = self.engine.fraud(ctx)
-                result = rules_pb2.RuleEvaluationResult()
+                total_score = fraud_result.get("total_score", 0)
+                result = results.add()
                 result.rule_id = "fraud"
                 result.rule_name = "Fraud Assessment"
-                result.matched = fraud_result.get("total_score", 0) > 0
-                result.score = fraud_result.get("total_score", 0)
+                result.matched = total_score > 0
+                result.score = total_score
                 result.action = fraud_result.get("action", "ALLOW")
-                result.metadata["total_score"] = str(fraud_result.get("total_score", 0))
-                results.append(result)
+                result.metadata["total_score"] = str(total_score)
             
             if "compliance" in requested_types:
                 compliance_result = self.engine.compliance(ctx)
-                result = rules_pb2.RuleEvaluationResult()
+                overall_pass = compliance_result.get("overall_pass", False)
+                result = results.add()
                 result.rule_id = "compliance"
                 result.rule_name = "Compliance Check"
-                result.matched = compliance_result.get("overall_pass", False)
-                result.action = "PASS" if compliance_result.get("overall_pass", False) else "FAIL"
-                result.metadata["mandatory_failures"] = str(len(compliance_result.get("mandatory_failures", [])))
-                results.append(result)
+                result.matched = overall_pass
+                result.action = "PASS" if overall_pass else "FAIL"
+                result.metadata["mandatory_failures"] = _count_str(len(compliance_result.get("mandatory_failures", [])))
             
             if "business" in requested_types:
                 business_result = self.engine.business(ctx)
                 for business_action in business_result:
-                    result = rules_pb2.RuleEvaluationResult()
+                    result = results.add()
                     result.rule_id = business_action.get("rule_id", "business")
                     result.rule_name = business_action.get("rule_name", "Business Rule")
                     result.matched = True
                     result.action = business_action.get("action", "")
                     result.metadata["discount"] = str(business_action.get("discount", 0))
-                    results.append(result)
             
-            # Create response
-            response = rules_pb2.EvaluateRulesResponse()
             response.success = True
             response.message = f"Evaluated {len(results)} rule results"
-            response.results.extend(results)
             
             logger.info(f"Evaluated rules for context with {len(results)} results")
             return response
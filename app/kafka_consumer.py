@@ -2,15 +2,31 @@ import asyncio
 import logging
 import json
 import os
-from typing import Optional
-from confluent_kafka import Consumer, KafkaError
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from confluent_kafka import Consumer, KafkaError, TopicPartition
+from config.config import get_settings
 try:
     from .proto_gen import rules_pb2
 except ImportError:  # proto files not generated
     rules_pb2 = None
 from .models import RuleModel, proto_to_pydantic_rule
+from .redis_store import rule_redis_key
 
 logger = logging.getLogger(__name__)
+# Lets production quieten the consumer independently, e.g. KAFKA_LOG_LEVEL=WARNING
+if get_settings().kafka.log_level:
+    logger.setLevel(get_settings().kafka.log_level.upper())
+
+# Max messages per consume() call and how long it may block waiting
+POLL_BATCH_SIZE = 100
+POLL_TIMEOUT = 1.0
+# Messages buffered between the poller and the processor; a full queue
+# pauses polling, which is the consumer's only backpressure
+QUEUE_MAXSIZE = 1000
+# Backoff between attempts at a batch that failed to process (seconds)
+RETRY_BACKOFF_INITIAL = 0.5
+RETRY_BACKOFF_MAX = 30.0
 
 class KafkaConsumerManager:
     def __init__(self, engine, redis, topic="rules"):
@@ -19,6 +35,12 @@ class KafkaConsumerManager:
         self.topic = topic
         self.consumer: Optional[Consumer] = None
         self.running = False
+        # The consumer is only ever polled from this one thread
+        self._poll_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="kafka-poll")
+        # Scratch message reused for every parse; conversion copies out all fields
+        self._proto_rule = rules_pb2.Rule() if rules_pb2 else None
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_MAXSIZE)
+        self._processor_task: Optional[asyncio.Task] = None
         
     async def start(self):
         """Start the Kafka consumer with proper error handling"""
@@ -29,79 +51,130 @@ class KafkaConsumerManager:
                 "bootstrap.servers": bootstrap_servers,
                 "group.id": "rule_engine",
                 "auto.offset.reset": "earliest",
-                "enable.auto.commit": True,
+                # Offsets are committed after each batch reaches Redis and the engine
+                "enable.auto.commit": False,
                 "session.timeout.ms": 6000,
                 "heartbeat.interval.ms": 1000,
                 "max.poll.interval.ms": 300000,
-                "fetch.wait.max.ms": 500
+                "fetch.min.bytes": 65536,
+                "fetch.wait.max.ms": 100
             }
             
-            logger.info(f"Starting Kafka consumer with bootstrap.servers: {bootstrap_servers}")
+            logger.info("Starting Kafka consumer with bootstrap.servers: %s", bootstrap_servers)
             self.consumer = Consumer(conf)
             self.consumer.subscribe([self.topic])
             self.running = True
             
-            logger.info(f"Kafka consumer started for topic: {self.topic}")
+            logger.info("Kafka consumer started for topic: %s", self.topic)
             
-            # Start polling loop
+            # Single processor task drains what the polling loop enqueues
+            self._processor_task = asyncio.create_task(self._processor_loop())
             await self._poll_loop()
             
         except Exception as e:
-            logger.error(f"Failed to start Kafka consumer: {e}")
+            logger.error("Failed to start Kafka consumer: %s", e)
             raise
+        finally:
+            # Also runs when the owning task is cancelled at shutdown
+            await self.stop()
     
     async def stop(self):
-        """Stop the Kafka consumer gracefully"""
+        """Stop the Kafka consumer gracefully; safe to call more than once"""
         self.running = False
-        if self.consumer:
-            self.consumer.close()
+        processor, self._processor_task = self._processor_task, None
+        if processor:
+            processor.cancel()
+            await asyncio.gather(processor, return_exceptions=True)
+        consumer, self.consumer = self.consumer, None
+        if consumer:
+            # Close on the poll thread so it runs after any in-flight consume()
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self._poll_executor, consumer.close)
             logger.info("Kafka consumer stopped")
+        self._poll_executor.shutdown(wait=False)
     
     async def _poll_loop(self):
-        """Main polling loop with error handling"""
-        loop = asyncio.get_event_loop()
+        """Main polling loop with error handling
+        
+        consume() blocks on the dedicated poll thread and returns as soon as
+        messages are available (or after the timeout), so there is no sleep
+        between polls and one executor hop covers a whole batch.  Messages
+        are handed to _processor_loop through the bounded queue.
+        """
+        loop = asyncio.get_running_loop()
         
         while self.running:
             try:
-                # Poll for messages (non-blocking)
-                await loop.run_in_executor(None, self._poll_messages)
+                messages = await loop.run_in_executor(
+                    self._poll_executor, self.consumer.consume, POLL_BATCH_SIZE, POLL_TIMEOUT
+                )
                 
-                # Small delay to prevent busy-waiting
-                await asyncio.sleep(0.1)
+                for msg in messages:
+                    if msg.error():
+                        if msg.error().code() == KafkaError._PARTITION_EOF:
+                            logger.debug("Reached end of partition: %s", msg.topic())
+                        else:
+                            logger.error("Kafka error: %s", msg.error())
+                        continue
+                    
+                    await self._queue.put(msg)
                 
             except Exception as e:
-                logger.error(f"Error in Kafka polling loop: {e}")
+                logger.error("Error in Kafka polling loop: %s", e)
                 # Continue polling even if individual message processing fails
                 await asyncio.sleep(1)
     
-    def _poll_messages(self):
-        """Poll for messages synchronously"""
-        try:
-            msg = self.consumer.poll(1.0)
-            
-            if msg is None:
-                return
-            
-            if msg.error():
-                if msg.error().code() == KafkaError._PARTITION_EOF:
-                    logger.debug(f"Reached end of partition: {msg.topic()}")
-                else:
-                    logger.error(f"Kafka error: {msg.error()}")
-                return
+    async def _processor_loop(self):
+        """Drain the queue in batches of up to POLL_BATCH_SIZE messages
+        
+        A batch's offsets are committed only once it has been stored and
+        applied.  A failed batch is retried with exponential backoff before
+        any newer message is taken, so no later commit can skip past it;
+        meanwhile the queue fills and polling pauses.  Reapplying a batch
+        is idempotent (MSET plus upsert), so a partial failure is safe.
+        """
+        queue = self._queue
+        while True:
+            batch = [await queue.get()]
+            while len(batch) < POLL_BATCH_SIZE and not queue.empty():
+                batch.append(queue.get_nowait())
             
-            # Process the message in the asyncio loop
-            asyncio.get_running_loop().call_soon_threadsafe(
-                asyncio.create_task, self._process_message(msg.value())
-            )
+            payloads = [msg.value() for msg in batch]
+            backoff = RETRY_BACKOFF_INITIAL
+            while True:
+                try:
+                    await self._process_batch(payloads)
+                    break
+                except Exception as e:
+                    logger.error(
+                        "Error processing Kafka batch of %d messages, retrying in %.1fs: %s",
+                        len(batch), backoff, e
+                    )
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, RETRY_BACKOFF_MAX)
             
-        except Exception as e:
-            logger.error(f"Error polling Kafka messages: {e}")
+            try:
+                self._commit(batch)
+            except Exception as e:
+                # The next batch's commit covers these offsets as well
+                logger.error("Failed to commit Kafka offsets: %s", e)
     
-    async def _process_message(self, message_bytes: bytes):
-        """Process a single Kafka message"""
+    def _commit(self, batch: list):
+        """Asynchronously commit the offset after each partition's last message"""
+        next_offsets = {}
+        for msg in batch:
+            next_offsets[(msg.topic(), msg.partition())] = msg.offset() + 1
+        self.consumer.commit(
+            offsets=[TopicPartition(t, p, o) for (t, p), o in next_offsets.items()],
+            asynchronous=True
+        )
+    
+    def _parse_message(self, message_bytes: bytes) -> Optional[RuleModel]:
+        """Parse a single Kafka message into a rule; None if it is unusable"""
         try:
-            # Parse protobuf message
-            proto_rule = rules_pb2.Rule()
+            # Parse protobuf message into the reused scratch message
+            proto_rule = self._proto_rule
+            proto_rule.Clear()
             proto_rule.ParseFromString(message_bytes)
             
             # Convert to Pydantic model
@@ -110,22 +183,40 @@ class KafkaConsumerManager:
             # Validate the rule
             if not pydantic_rule.id:
                 logger.warning("Received rule without ID, skipping")
-                return
-            
-            # Store in Redis
-            rule_key = f"rule:{pydantic_rule.id}"
-            await self.redis.set(rule_key, message_bytes)
+                return None
             
-            # Update engine with new rule
-            current_rules = [r for r in self.engine.rules if r.id != pydantic_rule.id]
-            current_rules.append(pydantic_rule)
-            self.engine.load(current_rules)
-            
-            logger.info(f"Processed rule update: {pydantic_rule.id}")
+            return pydantic_rule
             
         except Exception as e:
-            logger.error(f"Failed to process Kafka message: {e}")
+            logger.error("Failed to process Kafka message: %s", e)
             # Don't re-raise - continue processing other messages
+            return None
+    
+    async def _process_batch(self, payloads: List[bytes]):
+        """Store a batch of rule updates with one MSET and apply them to the
+        engine once. A later message for the same rule id wins."""
+        updates: Dict[str, RuleModel] = {}
+        raw: Dict[bytes, bytes] = {}
+        for message_bytes in payloads:
+            pydantic_rule = self._parse_message(message_bytes)
+            if pydantic_rule is None:
+                continue
+            updates[pydantic_rule.id] = pydantic_rule
+            raw[rule_redis_key(pydantic_rule.id)] = message_bytes
+        
+        if not updates:
+            return
+        
+        # Store in Redis
+        await self.redis.mset(raw)
+        
+        # Update engine incrementally; only the touched rules are recompiled
+        for pydantic_rule in updates.values():
+            self.engine.upsert(pydantic_rule)
+        
+        # Steady-state path: debug only, and the id list is only joined if enabled
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Processed %d rule updates: %s", len(updates), ", ".join(updates))
 
 # Global consumer manager instance
 consumer_manager: Optional[KafkaConsumerManager] = None
@@ -139,7 +230,7 @@ async def start(engine, redis, topic="rules"):
         await consumer_manager.start()
         
     except Exception as e:
-        logger.error(f"Failed to start Kafka consumer: {e}")
+        logger.error("Failed to start Kafka consumer: %s", e)
         raise
 
 async def stop():
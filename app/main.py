@@ -1,22 +1,31 @@
 from fastapi import FastAPI, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
-from typing import Optional, Dict, Any, List
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Optional, Dict, Any, List, Set
 import time
 import asyncio
 import logging
 import os
+from concurrent.futures import ThreadPoolExecutor
+from config.config import get_settings
 from .engine import RuleEngine
-from .redis_store import get_redis
+from .redis_store import (
+    get_redis,
+    RULE_KEY_PATTERN,
+    RULE_SCAN_COUNT,
+    rule_redis_key,
+)
 
 # Configure logging
-logging.basicConfig(level=logging.INFO)
+logging.basicConfig(level=get_settings().service.log_level.upper())
 logger = logging.getLogger(__name__)
 
 app = FastAPI(
     title="Money Transfer Rules Engine",
     description="A high-performance rules engine for money transfer processing",
     version="1.0.0",
+    default_response_class=ORJSONResponse,
 )
 
 # Add CORS middleware
@@ -35,6 +44,9 @@ app.state.engine = engine
 class Context(BaseModel):
     """Enhanced transaction context for rule evaluation"""
 
+    # Strict: no coercion attempts; frozen: the engine only reads it
+    model_config = ConfigDict(extra="forbid", strict=True, frozen=True)
+
     txn_id: str
     destination_country: str
     source_country: str = "US"
@@ -54,6 +66,8 @@ class Context(BaseModel):
 class EvaluationResponse(BaseModel):
     """Structured response for rule evaluation"""
 
+    model_config = ConfigDict(extra="forbid", strict=True, frozen=True)
+
     success: bool
     processors: List[str]
     fraud: Dict[str, Any]
@@ -64,7 +78,7 @@ class EvaluationResponse(BaseModel):
 
 
 # Global tasks for graceful shutdown
-background_tasks = []
+background_tasks: Set[asyncio.Task] = set()
 
 
 async def load_sample_rules():
@@ -78,15 +92,10 @@ async def load_sample_rules():
 
         redis = await get_redis()
 
-        # Check if rules already exist
-        existing_rules = []
-        async for key in redis.scan_iter(match="rule:*"):
-            existing_rules.append(key)
-
-        if existing_rules:
-            logger.info(
-                f"Found {len(existing_rules)} existing rules, skipping sample loading"
-            )
+        # Check if any rule exists; stop at the first key instead of
+        # walking the whole keyspace
+        async for key in redis.scan_iter(match=RULE_KEY_PATTERN, count=RULE_SCAN_COUNT):
+            logger.info("Found existing rule %r, skipping sample loading", key)
             return
 
         # Import sample rules creation
@@ -153,89 +162,37 @@ async def load_sample_rules():
             ),
         ]
 
-        # Load rules into Redis using protobuf when available
+        # Store sample rules in Redis as serialized protobuf
         from .models import pydantic_to_proto_rule
 
-        for rule in rules:
-            rule_key = f"rule:{rule.id}"
-            try:
-                proto_rule = pydantic_to_proto_rule(rule)
-                await redis.set(rule_key, proto_rule.SerializeToString())
-            except Exception as e:
-                logger.warning(f"Falling back to JSON for {rule.id}: {e}")
-                if hasattr(rule, "model_dump_json"):
-                    rule_data = rule.model_dump_json()
-                else:
-                    rule_data = rule.json()
-                await redis.set(rule_key, rule_data)
+        # Sample rules are known good; a conversion failure is a bug.
+        # All of them go out in a single MSET round trip.
+        await redis.mset(
+            {
+                rule_redis_key(rule.id): pydantic_to_proto_rule(rule).SerializeToString()
+                for rule in rules
+            }
+        )
 
         # Load rules into engine from Redis
         await load_rules_from_redis()
 
-        logger.info(f"✅ Successfully loaded {len(rules)} sample rules")
+        logger.info("✅ Successfully loaded %d sample rules", len(rules))
 
     except Exception as e:
-        logger.error(f"Failed to load sample rules: {e}")
+        logger.error("Failed to load sample rules: %s", e)
         # Don't raise - sample rules are optional
 
 
 async def load_rules_from_redis():
     """Load all rules from Redis into the engine"""
     try:
-        import json
-        from .models import RuleModel
-
         redis = await get_redis()
-
-        rules = []
-        async for key in redis.scan_iter(match="rule:*"):
-            rule_data = await redis.get(key)
-            if not rule_data:
-                continue
-
-            try:
-                rule = None
-                if isinstance(rule_data, bytes):
-                    # Try protobuf first
-                    try:
-                        from .proto_gen import rules_pb2
-                        from .models import proto_to_pydantic_rule
-
-                        proto_rule = rules_pb2.Rule()
-                        proto_rule.ParseFromString(rule_data)
-                        rule = proto_to_pydantic_rule(proto_rule)
-                    except Exception:
-                        # Fallback to JSON
-                        try:
-                            rule_json = rule_data.decode("utf-8")
-                            rule_dict = json.loads(rule_json)
-                            if hasattr(RuleModel, "model_validate"):
-                                rule = RuleModel.model_validate(rule_dict)
-                            else:
-                                rule = RuleModel.parse_obj(rule_dict)
-                        except (UnicodeDecodeError, json.JSONDecodeError) as e:
-                            raise ValueError(f"Invalid rule data: {e}")
-                else:
-                    rule_dict = (
-                        json.loads(rule_data)
-                        if isinstance(rule_data, str)
-                        else rule_data
-                    )
-                    if hasattr(RuleModel, "model_validate"):
-                        rule = RuleModel.model_validate(rule_dict)
-                    else:
-                        rule = RuleModel.parse_obj(rule_dict)
-
-                if rule:
-                    rules.append(rule)
-            except Exception as e:
-                logger.warning(f"Failed to parse rule {key}: {e}")
-
-        engine.load(rules)
-        logger.info(f"Loaded {len(rules)} rules from Redis into engine")
+        await engine.load_from_redis(redis)
+        logger.info("Loaded %d rules from Redis into engine", len(engine.rules))
 
     except Exception as e:
-        logger.error(f"Failed to load rules from Redis: {e}")
+        logger.error("Failed to load rules from Redis: %s", e)
 
 
 @app.on_event("startup")
@@ -243,6 +200,26 @@ async def start_services():
     """Initialize all services on startup"""
     try:
         from . import kafka_consumer, grpc_server
+        from .metrics import metrics as metrics_collector, setup_service_info
+
+        setup_service_info(get_settings().environment)
+        # Rule and HTTP observations are applied in batches from here on
+        metrics_collector.start_flusher()
+
+        # protobuf>=4.21 parses in C via upb; the pure-Python fallback is
+        # an order of magnitude slower on every rule (de)serialization
+        from google.protobuf.internal import api_implementation
+
+        if api_implementation.Type() == "python":
+            logger.warning(
+                "protobuf is using the pure-Python implementation; "
+                "install a protobuf wheel with upb/cpp support"
+            )
+
+        # Sized for CPU-bound rule evaluation dispatched via asyncio.to_thread
+        asyncio.get_running_loop().set_default_executor(
+            ThreadPoolExecutor(max_workers=os.cpu_count() or 4)
+        )
 
         redis = await get_redis()
 
@@ -261,11 +238,11 @@ async def start_services():
         grpc_task = asyncio.create_task(grpc_server.serve(engine, redis))
 
         # Store tasks for graceful shutdown
-        background_tasks.extend([kafka_task, grpc_task])
+        background_tasks.update((kafka_task, grpc_task))
 
         logger.info("All services started successfully")
     except Exception as e:
-        logger.error(f"Failed to start services: {e}")
+        logger.error("Failed to start services: %s", e)
         raise
 
 
@@ -273,56 +250,58 @@ async def start_services():
 async def shutdown_services():
     """Gracefully shutdown background services"""
     logger.info("Shutting down services...")
+    # Cancel everything first and wait for all of it together, so a slow
+    # Kafka close does not hold up the gRPC shutdown (or vice versa)
     for task in background_tasks:
-        if not task.done():
-            task.cancel()
-            try:
-                await task
-            except asyncio.CancelledError:
-                pass
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    background_tasks.clear()
+
+    # Stop batching and apply whatever observations are still queued
+    from .metrics import metrics as metrics_collector
+
+    await metrics_collector.stop_flusher()
     logger.info("All services shut down")
 
 
-@app.post("/evaluate", response_model=EvaluationResponse)
+@app.post("/evaluate", responses={200: {"model": EvaluationResponse}})
 async def evaluate(ctx: Context):
-    """Evaluate all rules for a transaction context"""
-    start_time = time.time()
+    """Evaluate all rules for a transaction context
+
+    The result is returned as a plain dict, which ORJSONResponse serializes
+    directly, without a response_model validation pass.
+    """
+    start_ns = time.perf_counter_ns()
 
     try:
-        # Get routing decision
-        route = engine.route(ctx)
+        # Routing, fraud, compliance and business rules in one engine pass
+        # Off the event loop so Kafka, gRPC and other requests keep running
+        route, fraud_result, compliance_result, business_result = await asyncio.to_thread(
+            engine.evaluate_all, ctx
+        )
         if not route:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="No routing rule matched the transaction context",
             )
 
-        # Get fraud assessment
-        fraud_result = engine.fraud(ctx)
-
-        # Get compliance check
-        compliance_result = engine.compliance(ctx)
-
-        # Get business rules
-        business_result = engine.business(ctx)
-
         # Calculate execution time
-        execution_time = (time.time() - start_time) * 1000
-
-        return EvaluationResponse(
-            success=True,
-            processors=route,
-            fraud=fraud_result,
-            compliance=compliance_result,
-            business=business_result,
-            execution_time_ms=execution_time,
-            rules_evaluated=len(engine.rules),
-        )
+        execution_time = (time.perf_counter_ns() - start_ns) / 1e6
+
+        return {
+            "success": True,
+            "processors": route,
+            "fraud": fraud_result,
+            "compliance": compliance_result,
+            "business": business_result,
+            "execution_time_ms": execution_time,
+            "rules_evaluated": len(engine.rules),
+        }
 
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Rule evaluation failed: {e}")
+        logger.error("Rule evaluation failed: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Rule evaluation failed: {str(e)}",
@@ -336,7 +315,7 @@ async def health_check():
         health_info = engine.health_check()
         return {"status": "healthy", "timestamp": time.time(), "engine": health_info}
     except Exception as e:
-        logger.error(f"Health check failed: {e}")
+        logger.error("Health check failed: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Health check failed: {str(e)}",
@@ -365,7 +344,7 @@ async def get_metrics():
             },
         }
     except Exception as e:
-        logger.error(f"Metrics retrieval failed: {e}")
+        logger.error("Metrics retrieval failed: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Metrics retrieval failed: {str(e)}",
@@ -379,7 +358,7 @@ async def clear_cache():
         engine.clear_cache()
         return {"message": "Cache cleared successfully"}
     except Exception as e:
-        logger.error(f"Cache clear failed: {e}")
+        logger.error("Cache clear failed: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Cache clear failed: {str(e)}",
@@ -390,17 +369,9 @@ async def clear_cache():
 async def get_rule_count():
     """Get current rule counts by type"""
     try:
-        counts = {
-            "total": len(engine.rules),
-            "routing": sum(1 for r in engine.rules if r.routing),
-            "fraud": sum(1 for r in engine.rules if r.fraud),
-            "compliance": sum(1 for r in engine.rules if r.compliance),
-            "business": sum(1 for r in engine.rules if r.business),
-            "enabled": sum(1 for r in engine.rules if r.enabled),
-        }
-        return counts
+        return engine.rule_counts()
     except Exception as e:
-        logger.error(f"Rule count retrieval failed: {e}")
+        logger.error("Rule count retrieval failed: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Rule count retrieval failed: {str(e)}",
@@ -416,4 +387,7 @@ async def value_error_handler(request, exc):
 if __name__ == "__main__":
     import uvicorn
 
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # libuv event loop and C HTTP parser (both shipped with uvicorn[standard]).
+    # A single worker: each worker would start its own Kafka consumer in the
+    # same group and only receive a share of the rule updates.
+    uvicorn.run(app, host="0.0.0.0", port=8000, loop="uvloop", http="httptools")
@@ -1,5 +1,8 @@
-rom prometheus_client import Counter, Histogram, Gauge, Info, start_http_server
-from typing import Dict, Any
+from prometheus_client import Counter, Histogram, Gauge, Info, start_http_server
+from typing import Dict, Any, Optional
+from collections import deque
+import asyncio
+import sys
 import time
 import functools
 import logging
@@ -7,17 +10,20 @@ from contextlib import contextmanager
 
 logger = logging.getLogger(__name__)
 
+# How often the background flusher applies queued observations (seconds)
+FLUSH_INTERVAL = 0.5
+
 # Prometheus metrics
 RULE_EVALUATIONS = Counter(
     'rule_evaluations_total',
     'Total number of rule evaluations',
-    ['rule_type', 'rule_id', 'status']
+    ['rule_type', 'status']  # rule ids are unbounded; they go to the logs instead
 )
 
 RULE_EXECUTION_TIME = Histogram(
     'rule_execution_duration_seconds',
     'Time spent executing rules',
-    ['rule_type', 'rule_id'],
+    ['rule_type'],
     buckets=[0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0]
 )
 
@@ -63,57 +69,159 @@ SERVICE_INFO = Info(
     'Service information'
 )
 
+def setup_service_info(environment: str):
+    """Publish service_info; call once at application startup"""
+    SERVICE_INFO.info({
+        'version': '1.0.0',
+        'python_version': '%d.%d.%d' % sys.version_info[:3],
+        'environment': environment
+    })
+
 class MetricsCollector:
     """Centralized metrics collection"""
     
     def __init__(self):
-        self.start_time = time.time()
-        
-        # Set service info
-        SERVICE_INFO.info({
-            'version': '1.0.0',
-            'python_version': '3.11',
-            'environment': 'development'  # Should come from config
-        })
+        self.start_time = time.monotonic()
+        # Label children bound once per label set; .labels() validates and
+        # hashes its arguments under a lock on every call
+        self._rule_metric_children: Dict[str, tuple] = {}
+        self._http_duration_children: Dict[tuple, Any] = {}
+        self._http_request_children: Dict[tuple, Any] = {}
+        # Observations queued while the background flusher runs; deque
+        # append/popleft are atomic, so hot paths never take a lock
+        self._pending_rules: deque = deque()
+        self._pending_http: deque = deque()
+        self._flusher: Optional[asyncio.Task] = None
     
     @contextmanager
     def time_rule_execution(self, rule_type: str, rule_id: str):
-        """Context manager for timing rule execution"""
-        start_time = time.time()
+        """Context manager for timing rule execution
+        
+        Metrics are labelled by rule type only; the rule id is attached to
+        the debug log line so per-rule detail never creates new series.
+        """
+        start_time = time.perf_counter()
         try:
             yield
-            duration = time.time() - start_time
-            RULE_EXECUTION_TIME.labels(rule_type=rule_type, rule_id=rule_id).observe(duration)
-            RULE_EVALUATIONS.labels(rule_type=rule_type, rule_id=rule_id, status='success').inc()
+            duration = time.perf_counter() - start_time
+            self._record_rule(rule_type, True, duration)
+            logger.debug("Rule %s (%s) succeeded in %.6fs", rule_id, rule_type, duration)
         except Exception:
-            duration = time.time() - start_time
-            RULE_EXECUTION_TIME.labels(rule_type=rule_type, rule_id=rule_id).observe(duration)
-            RULE_EVALUATIONS.labels(rule_type=rule_type, rule_id=rule_id, status='error').inc()
+            duration = time.perf_counter() - start_time
+            self._record_rule(rule_type, False, duration)
+            logger.debug("Rule %s (%s) failed in %.6fs", rule_id, rule_type, duration)
             raise
     
     @contextmanager
     def time_http_request(self, method: str, endpoint: str):
         """Context manager for timing HTTP requests"""
-        start_time = time.time()
+        start_time = time.perf_counter()
         status_code = 'unknown'
         try:
             yield
             status_code = '200'  # Default success
         except Exception as e:
-            if hasattr(e, 'status_code'):
-                status_code = str(e.status_code)
-            else:
-                status_code = '500'
+            status_code = _status_code(e)
             raise
         finally:
-            duration = time.time() - start_time
-            HTTP_REQUEST_DURATION.labels(method=method, endpoint=endpoint).observe(duration)
-            HTTP_REQUESTS.labels(method=method, endpoint=endpoint, status_code=status_code).inc()
+            duration = time.perf_counter() - start_time
+            self._record_http(method, endpoint, status_code, duration)
+    
+    def _record_rule(self, rule_type: str, success: bool, duration: float):
+        """Queue a rule observation, or apply it now if no flusher runs"""
+        if self._flusher is not None:
+            self._pending_rules.append((rule_type, success, duration))
+            return
+        execution_time, succeeded, failed = self._rule_children(rule_type)
+        execution_time.observe(duration)
+        (succeeded if success else failed).inc()
+    
+    def _record_http(self, method: str, endpoint: str, status_code: str, duration: float):
+        """Queue an HTTP observation, or apply it now if no flusher runs"""
+        if self._flusher is not None:
+            self._pending_http.append((method, endpoint, status_code, duration))
+            return
+        self._http_duration(method, endpoint).observe(duration)
+        self._http_requests(method, endpoint, status_code).inc()
+    
+    def flush(self):
+        """Apply queued observations, one inc(n) per counter label set"""
+        counts: Dict[Any, int] = {}
+        
+        pending = self._pending_rules
+        while pending:
+            rule_type, success, duration = pending.popleft()
+            execution_time, succeeded, failed = self._rule_children(rule_type)
+            execution_time.observe(duration)
+            counter = succeeded if success else failed
+            counts[counter] = counts.get(counter, 0) + 1
+        
+        pending = self._pending_http
+        while pending:
+            method, endpoint, status_code, duration = pending.popleft()
+            self._http_duration(method, endpoint).observe(duration)
+            counter = self._http_requests(method, endpoint, status_code)
+            counts[counter] = counts.get(counter, 0) + 1
+        
+        for counter, n in counts.items():
+            counter.inc(n)
+    
+    def start_flusher(self):
+        """Start batching metric updates on the running event loop"""
+        if self._flusher is None:
+            self._flusher = asyncio.get_running_loop().create_task(self._flush_loop())
+    
+    async def stop_flusher(self):
+        """Stop the flusher and apply whatever is still queued"""
+        task, self._flusher = self._flusher, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        self.flush()
+    
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error("Metrics flush failed: %s", e)
+    
+    def _rule_children(self, rule_type: str) -> tuple:
+        """(duration, success, error) metric children for a rule type"""
+        children = self._rule_metric_children.get(rule_type)
+        if children is None:
+            children = (
+                RULE_EXECUTION_TIME.labels(rule_type=rule_type),
+                RULE_EVALUATIONS.labels(rule_type=rule_type, status='success'),
+                RULE_EVALUATIONS.labels(rule_type=rule_type, status='error'),
+            )
+            self._rule_metric_children[rule_type] = children
+        return children
+    
+    def _http_duration(self, method: str, endpoint: str):
+        """HTTP duration histogram child for (method, endpoint)"""
+        key = (method, endpoint)
+        child = self._http_duration_children.get(key)
+        if child is None:
+            child = HTTP_REQUEST_DURATION.labels(method=method, endpoint=endpoint)
+            self._http_duration_children[key] = child
+        return child
+    
+    def _http_requests(self, method: str, endpoint: str, status_code: str):
+        """HTTP request counter child for (method, endpoint, status_code)"""
+        key = (method, endpoint, status_code)
+        child = self._http_request_children.get(key)
+        if child is None:
+            child = HTTP_REQUESTS.labels(method=method, endpoint=endpoint, status_code=status_code)
+            self._http_request_children[key] = child
+        return child
     
     def update_active_rules(self, rules_by_type: Dict[str, int]):
-        """Update active rules gauge"""
+        """Update active rules gauge and pre-bind each type's rule metrics"""
         for rule_type, count in rules_by_type.items():
             ACTIVE_RULES.labels(rule_type=rule_type).set(count)
+            self._rule_children(rule_type)
     
     def record_cache_operation(self, operation: str):
         """Record cache operation (hit/miss/clear)"""
@@ -130,33 +238,61 @@ class MetricsCollector:
 # Global metrics collector
 metrics = MetricsCollector()
 
+def _status_code(exc: Exception) -> str:
+    """HTTP status label for a request that raised exc"""
+    return str(getattr(exc, 'status_code', 500))
+
 def instrument_rule_execution(rule_type: str):
-    """Decorator for instrumenting rule execution"""
+    """Decorator for instrumenting rule execution
+    
+    Timing is inlined rather than going through time_rule_execution, so
+    each call costs two perf_counter() reads and one record call.
+    """
     def decorator(func):
+        # Bind the rule type's metric children when the function is decorated
+        metrics._rule_children(rule_type)
+        
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
-            # Extract rule_id from first argument if it's a rule object
-            rule_id = 'unknown'
-            if args and hasattr(args[0], 'id'):
-                rule_id = args[0].id
-            
-            with metrics.time_rule_execution(rule_type, rule_id):
-                return func(*args, **kwargs)
+            start_time = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except Exception:
+                metrics._record_rule(rule_type, False, time.perf_counter() - start_time)
+                raise
+            metrics._record_rule(rule_type, True, time.perf_counter() - start_time)
+            return result
         return wrapper
     return decorator
 
 def instrument_http_endpoint(endpoint: str):
     """Decorator for instrumenting HTTP endpoints"""
     def decorator(func):
+        # Bind the duration child when the endpoint is decorated
+        metrics._http_duration('POST', endpoint)
+        is_coroutine = asyncio.iscoroutinefunction(func)
+        
         @functools.wraps(func)
         async def async_wrapper(*args, **kwargs):
-            with metrics.time_http_request('POST', endpoint):  # Assume POST for now
-                return await func(*args, **kwargs)
+            start_time = time.perf_counter()  # Assume POST for now
+            try:
+                result = await func(*args, **kwargs)
+            except Exception as e:
+                metrics._record_http('POST', endpoint, _status_code(e), time.perf_counter() - start_time)
+                raise
+            metrics._record_http('POST', endpoint, '200', time.perf_counter() - start_time)
+            return result
         
         @functools.wraps(func)
         def sync_wrapper(*args, **kwargs):
-            with metrics.time_http_request('POST', endpoint):
-                return func(*args, **kwargs)
+            start_time = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                metrics._record_http('POST', endpoint, _status_code(e), time.perf_counter() - start_time)
+                raise
+            metrics._record_http('POST', endpoint, '200', time.perf_counter() - start_time)
+            return result
         
-        return async_wrapper if asyncio.iscoroutinefunction(func) else sync_wrapper
-    return decorator
\ No newline at end of file
+        return async_wrapper if is_coroutine else sync_wrapper
+    return decorator
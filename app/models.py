@@ -1,14 +1,21 @@
-try:
-    from pydantic.v1 import BaseModel, Field, conlist, confloat, validator, root_validator
-except ImportError:  # Pydantic <2
-    from pydantic import BaseModel, Field, conlist, confloat, validator, root_validator
+from pydantic import BaseModel, Field, model_validator
 
-from typing import List, Optional
+from typing import Annotated, List, Optional
 from enum import Enum
 
 from datetime import datetime
 import uuid
 
+from google.protobuf.timestamp_pb2 import Timestamp
+try:
+    from .proto_gen import rules_pb2
+except ImportError:  # proto files not generated
+    rules_pb2 = None
+
+def _require_protos() -> None:
+    if rules_pb2 is None:
+        raise ImportError("Proto classes not generated. Run: ./scripts/gen_protos.ps1 or ./scripts/gen_protos.sh")
+
 class PaymentMethod(str, Enum):
     CARD = "CARD"
     CASH = "CASH"
@@ -20,21 +27,29 @@ class FraudAction(str, Enum):
     REVIEW = "REVIEW"
     ALLOW = "ALLOW"
 
+# Proto enum number <-> Python enum, built once so the converters index
+# directly instead of going through the enum names
+if rules_pb2 is not None:
+    _PM_BY_INT = {v: PaymentMethod[name] for name, v in rules_pb2.PaymentMethod.items()}
+    _PM_TO_INT = {m: v for v, m in _PM_BY_INT.items()}
+    _FA_BY_INT = {v: FraudAction[name] for name, v in rules_pb2.FraudAction.items()}
+    _FA_TO_INT = {a: v for v, a in _FA_BY_INT.items()}
+
 class RoutingRuleModel(BaseModel):
     name: str
     match: str
-    methods: conlist(PaymentMethod, min_items=1)
-    processors: conlist(str, min_items=1)
+    methods: Annotated[List[PaymentMethod], Field(min_length=1)]
+    processors: Annotated[List[str], Field(min_length=1)]
     priority: int = Field(..., ge=1, le=1000)
-    weight: confloat(ge=0.0, le=1.0) = 1.0
+    weight: Annotated[float, Field(ge=0.0, le=1.0)] = 1.0
     
 
 
 class FraudRuleModel(BaseModel):
     name: str
     expression: str
-    score_weight: confloat(ge=0, le=10)
-    threshold: confloat(ge=0, le=100)
+    score_weight: Annotated[float, Field(ge=0, le=10)]
+    threshold: Annotated[float, Field(ge=0, le=100)]
     action: FraudAction
 
 class ComplianceRuleModel(BaseModel):
@@ -48,12 +63,12 @@ class BusinessRuleModel(BaseModel):
     name: str
     condition: str
     action: str
-    discount: confloat(ge=0, le=100) = 0
+    discount: Annotated[float, Field(ge=0, le=100)] = 0
     tags: List[str] = []
 
 class RuleModel(BaseModel):
     # Core fields matching proto
-    id: str
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     ts: datetime = Field(default_factory=datetime.now)
     enabled: bool = True
     description: str = ""
@@ -67,39 +82,26 @@ class RuleModel(BaseModel):
     compliance: Optional[ComplianceRuleModel] = None
     business: Optional[BusinessRuleModel] = None
     
-    @root_validator(skip_on_failure=True)
-    def exactly_one_rule_type(cls, values):
+    @model_validator(mode="after")
+    def exactly_one_rule_type(self):
         """Ensure exactly one rule type is defined"""
         rule_types = ["routing", "fraud", "compliance", "business"]
-        defined_rules = [r for r in rule_types if values.get(r) is not None]
+        defined_rules = [r for r in rule_types if getattr(self, r) is not None]
 
         if len(defined_rules) == 0:
             raise ValueError("At least one rule type must be defined")
         elif len(defined_rules) > 1:
             raise ValueError(f"Only one rule type allowed, but found: {defined_rules}")
 
-        return values
-    
-    @validator("id", pre=True, always=True)
-    def generate_id_if_missing(cls, v):
-        """Generate UUID if id is not provided"""
-        return v or str(uuid.uuid4())
-    
-    @validator("last_modified", pre=True, always=True)
-    def update_last_modified(cls, v):
-        """Always update last_modified to current time"""
-        return datetime.now()
+        return self
 
 
 # Proto-to-Pydantic conversion functions
 def proto_to_pydantic_routing(proto_rule) -> RoutingRuleModel:
     """Convert proto RoutingRule to Pydantic RoutingRuleModel"""
-    try:
-        from .proto_gen import rules_pb2
-    except ImportError:
-        raise ImportError("Proto classes not generated. Run: ./scripts/gen_protos.sh")
+    _require_protos()
 
-    methods = [PaymentMethod[rules_pb2.PaymentMethod.Name(m)] for m in proto_rule.methods]
+    methods = [_PM_BY_INT[m] for m in proto_rule.methods]
     return RoutingRuleModel(
         name=proto_rule.name,
         match=proto_rule.match,
@@ -111,12 +113,9 @@ def proto_to_pydantic_routing(proto_rule) -> RoutingRuleModel:
 
 def proto_to_pydantic_fraud(proto_rule) -> FraudRuleModel:
     """Convert proto FraudRule to Pydantic FraudRuleModel"""
-    try:
-        from .proto_gen import rules_pb2
-    except ImportError:
-        raise ImportError("Proto classes not generated. Run: ./scripts/gen_protos.sh")
+    _require_protos()
 
-    action = FraudAction[rules_pb2.FraudAction.Name(proto_rule.action)]
+    action = _FA_BY_INT[proto_rule.action]
     return FraudRuleModel(
         name=proto_rule.name,
         expression=proto_rule.expression,
@@ -145,13 +144,26 @@ def proto_to_pydantic_business(proto_rule) -> BusinessRuleModel:
         tags=list(proto_rule.tags)
     )
 
+# oneof field name -> converter for that submessage
+_PROTO_RULE_CONVERTERS = {
+    "routing": proto_to_pydantic_routing,
+    "fraud": proto_to_pydantic_fraud,
+    "compliance": proto_to_pydantic_compliance,
+    "business": proto_to_pydantic_business,
+}
+
 def proto_to_pydantic_rule(proto_rule) -> RuleModel:
     """Convert proto Rule to Pydantic RuleModel"""
     # Convert timestamps from proto to datetime
     ts = datetime.fromtimestamp(proto_rule.ts.seconds + proto_rule.ts.nanos / 1e9)
-    last_modified = datetime.fromtimestamp(
-        proto_rule.last_modified.seconds + proto_rule.last_modified.nanos / 1e9
-    )
+    # An unset last_modified (e.g. a rule published straight to Kafka) means
+    # "modified now", as it did when RuleModel stamped missing values itself
+    if proto_rule.HasField("last_modified"):
+        last_modified = datetime.fromtimestamp(
+            proto_rule.last_modified.seconds + proto_rule.last_modified.nanos / 1e9
+        )
+    else:
+        last_modified = datetime.now()
     
     # Base rule data
     rule_data = {
@@ -164,25 +176,22 @@ def proto_to_pydantic_rule(proto_rule) -> RuleModel:
         "last_modified": last_modified,
     }
     
-    # Add the specific rule type
-    if proto_rule.HasField("routing"):
-        rule_data["routing"] = proto_to_pydantic_routing(proto_rule.routing)
-    elif proto_rule.HasField("fraud"):
-        rule_data["fraud"] = proto_to_pydantic_fraud(proto_rule.fraud)
-    elif proto_rule.HasField("compliance"):
-        rule_data["compliance"] = proto_to_pydantic_compliance(proto_rule.compliance)
-    elif proto_rule.HasField("business"):
-        rule_data["business"] = proto_to_pydantic_business(proto_rule.business)
+    # Add the specific rule type; one oneof lookup instead of a HasField per type
+    rule_type = proto_rule.WhichOneof("definition")
+    if rule_type is not None:
+        rule_data[rule_type] = _PROTO_RULE_CONVERTERS[rule_type](getattr(proto_rule, rule_type))
     
     return RuleModel(**rule_data)
 
+def _set_timestamp(timestamp: Timestamp, dt: datetime) -> None:
+    """Write dt into a proto Timestamp in place.  Naive datetimes are local
+    time, matching datetime.fromtimestamp() in proto_to_pydantic_rule"""
+    timestamp.seconds = int(dt.replace(microsecond=0).timestamp())
+    timestamp.nanos = dt.microsecond * 1000
+
 def pydantic_to_proto_rule(pydantic_rule: RuleModel):
     """Convert Pydantic RuleModel to proto Rule"""
-    try:
-        from .proto_gen import rules_pb2
-        from google.protobuf.timestamp_pb2 import Timestamp
-    except ImportError:
-        raise ImportError("Proto classes not generated. Run: ./scripts/gen_protos.ps1 or ./scripts/gen_protos.sh")
+    _require_protos()
     
     # Create new proto rule
     proto_rule = rules_pb2.Rule()
@@ -194,54 +203,42 @@ def pydantic_to_proto_rule(pydantic_rule: RuleModel):
     proto_rule.version = pydantic_rule.version
     proto_rule.created_by = pydantic_rule.created_by
     
-    # Convert datetime to proto timestamp
-    def datetime_to_timestamp(dt: datetime) -> Timestamp:
-        timestamp = Timestamp()
-        timestamp.FromDatetime(dt)
-        return timestamp
-    
-    proto_rule.ts.CopyFrom(datetime_to_timestamp(pydantic_rule.ts))
-    proto_rule.last_modified.CopyFrom(datetime_to_timestamp(pydantic_rule.last_modified))
+    _set_timestamp(proto_rule.ts, pydantic_rule.ts)
+    _set_timestamp(proto_rule.last_modified, pydantic_rule.last_modified)
     
-    # Convert specific rule type
+    # Convert specific rule type, writing straight into the oneof submessage
     if pydantic_rule.routing:
-        routing_rule = rules_pb2.RoutingRule()
-        routing_rule.name = pydantic_rule.routing.name
-        routing_rule.match = pydantic_rule.routing.match
-        routing_rule.methods[:] = [
-            rules_pb2.PaymentMethod.Value(m.name) for m in pydantic_rule.routing.methods
-        ]
-        routing_rule.processors[:] = pydantic_rule.routing.processors
-        routing_rule.priority = pydantic_rule.routing.priority
-        routing_rule.weight = pydantic_rule.routing.weight
-        proto_rule.routing.CopyFrom(routing_rule)
+        routing, source = proto_rule.routing, pydantic_rule.routing
+        routing.name = source.name
+        routing.match = source.match
+        routing.methods.extend(_PM_TO_INT[m] for m in source.methods)
+        routing.processors.extend(source.processors)
+        routing.priority = source.priority
+        routing.weight = source.weight
     
     elif pydantic_rule.fraud:
-        fraud_rule = rules_pb2.FraudRule()
-        fraud_rule.name = pydantic_rule.fraud.name
-        fraud_rule.expression = pydantic_rule.fraud.expression
-        fraud_rule.score_weight = pydantic_rule.fraud.score_weight
-        fraud_rule.threshold = pydantic_rule.fraud.threshold
-        fraud_rule.action = rules_pb2.FraudAction.Value(pydantic_rule.fraud.action.name)
-        proto_rule.fraud.CopyFrom(fraud_rule)
+        fraud, source = proto_rule.fraud, pydantic_rule.fraud
+        fraud.name = source.name
+        fraud.expression = source.expression
+        fraud.score_weight = source.score_weight
+        fraud.threshold = source.threshold
+        fraud.action = _FA_TO_INT[source.action]
     
     elif pydantic_rule.compliance:
-        compliance_rule = rules_pb2.ComplianceRule()
-        compliance_rule.name = pydantic_rule.compliance.name
-        compliance_rule.expression = pydantic_rule.compliance.expression
-        compliance_rule.mandatory = pydantic_rule.compliance.mandatory
-        compliance_rule.regulation = pydantic_rule.compliance.regulation
-        compliance_rule.countries[:] = pydantic_rule.compliance.countries
-        proto_rule.compliance.CopyFrom(compliance_rule)
+        compliance, source = proto_rule.compliance, pydantic_rule.compliance
+        compliance.name = source.name
+        compliance.expression = source.expression
+        compliance.mandatory = source.mandatory
+        compliance.regulation = source.regulation
+        compliance.countries.extend(source.countries)
     
     elif pydantic_rule.business:
-        business_rule = rules_pb2.BusinessRule()
-        business_rule.name = pydantic_rule.business.name
-        business_rule.condition = pydantic_rule.business.condition
-        business_rule.action = pydantic_rule.business.action
-        business_rule.discount = pydantic_rule.business.discount
-        business_rule.tags[:] = pydantic_rule.business.tags
-        proto_rule.business.CopyFrom(business_rule)
+        business, source = proto_rule.business, pydantic_rule.business
+        business.name = source.name
+        business.condition = source.condition
+        business.action = source.action
+        business.discount = source.discount
+        business.tags.extend(source.tags)
     
     else:
         raise ValueError("No rule type defined in Pydantic model")
@@ -251,10 +248,7 @@ def pydantic_to_proto_rule(pydantic_rule: RuleModel):
 
 def create_proto_response(success: bool, message: str, rule=None, errors=None):
     """Helper function to create proto RuleResponse"""
-    try:
-        from .proto_gen import rules_pb2
-    except ImportError:
-        raise ImportError("Proto classes not generated. Run: ./scripts/gen_protos.ps1 or ./scripts/gen_protos.sh")
+    _require_protos()
     
     response = rules_pb2.RuleResponse()
     response.success = success
@@ -1,11 +1,25 @@
+import orjson
 import structlog
 import logging.config
 from typing import Any, Dict
 import sys
 import json
 
+def _orjson_dumps(obj: Any, **kwargs: Any) -> str:
+    """orjson serializer for structlog's JSONRenderer (stdlib loggers want str)"""
+    return orjson.dumps(obj, **kwargs).decode()
+
+_CONFIGURED = False
+
 def configure_logging(log_level: str = "INFO", environment: str = "development") -> None:
-    """Configure structured logging with structlog"""
+    """Configure structured logging with structlog
+    
+    Only the first call takes effect, so reloaders and tests calling this
+    again do not stack handlers and format every record several times.
+    """
+    global _CONFIGURED
+    if _CONFIGURED:
+        return
     
     # Configure structlog
     structlog.configure(
@@ -18,7 +32,7 @@ def configure_logging(log_level: str = "INFO", environment: str = "development")
             structlog.processors.StackInfoRenderer(),
             structlog.processors.format_exc_info,
             structlog.processors.UnicodeDecoder(),
-            structlog.processors.JSONRenderer() if environment == "production" 
+            structlog.processors.JSONRenderer(serializer=_orjson_dumps) if environment == "production" 
             else structlog.dev.ConsoleRenderer(colors=True)
         ],
         wrapper_class=structlog.stdlib.BoundLogger,
@@ -76,7 +90,9 @@ def configure_logging(log_level: str = "INFO", environment: str = "development")
         }
     }
     
+    logging.getLogger('app').handlers.clear()
     logging.config.dictConfig(logging_config)
+    _CONFIGURED = True
 
 # Enhanced logging utilities
 def get_logger(name: str) -> structlog.stdlib.BoundLogger:
@@ -89,7 +105,14 @@ def log_rule_evaluation(logger: structlog.stdlib.BoundLogger,
                        context: Dict[str, Any], 
                        result: Any, 
                        execution_time: float) -> None:
-    """Log rule evaluation with structured data"""
+    """Log rule evaluation with structured data
+    
+    The summaries are only built when INFO is enabled for the logger
+    (structlog's unconfigured default logger has no level to check).
+    """
+    is_enabled_for = getattr(logger, "isEnabledFor", None)
+    if is_enabled_for is not None and not is_enabled_for(logging.INFO):
+        return
     logger.info(
         "rule_evaluated",
         rule_id=rule_id,
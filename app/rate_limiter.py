@@ -1,15 +1,69 @@
 import time
 import asyncio
+import bisect
+from array import array
 from typing import Dict, Optional
-from collections import defaultdict, deque
+from collections import OrderedDict
 import redis.asyncio as redis
 
+# Local limiter keys kept before the least recently used one is dropped
+LOCAL_CACHE_MAX_KEYS = 100_000
+
+# Sliding window in one atomic step: drop expired entries, count, record
+# the request only if it is allowed, refresh the TTL.  Returns the count
+# before this request.  The timestamp argument doubles as the member, so
+# the client encodes it once.
+_SLIDING_WINDOW_LUA = """
+local key = KEYS[1]
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local limit = tonumber(ARGV[3])
+redis.call('ZREMRANGEBYSCORE', key, 0, now - window)
+local count = redis.call('ZCARD', key)
+if count < limit then
+    redis.call('ZADD', key, now, ARGV[1])
+end
+redis.call('PEXPIRE', key, math.ceil((window + 1) * 1000))
+return count
+"""
+
+class _Window:
+    """Fixed-size ring of request timestamps for one local rate-limit key
+    
+    Entries are appended in time order, so the live part of the ring
+    (count entries starting at head) is sorted and expiry is a binary
+    search plus index arithmetic.
+    """
+    __slots__ = ("times", "head", "count")
+    
+    def __init__(self, size: int):
+        self.times = array("d", bytes(8 * size))
+        self.head = 0
+        self.count = 0
+    
+    def expire(self, cutoff: float) -> None:
+        """Drop every entry at or before cutoff"""
+        times, head, size = self.times, self.head, len(self.times)
+        expired = bisect.bisect_right(
+            range(self.count), cutoff, key=lambda i: times[(head + i) % size]
+        )
+        if expired:
+            self.head = (head + expired) % size
+            self.count -= expired
+    
+    def append(self, now: float) -> None:
+        self.times[(self.head + self.count) % len(self.times)] = now
+        self.count += 1
+
 class RateLimiter:
     """Redis-backed rate limiter with sliding window"""
     
     def __init__(self, redis_client: redis.Redis):
         self.redis = redis_client
-        self.local_cache: Dict[str, deque] = defaultdict(lambda: deque())
+        # Runs via EVALSHA, falling back to EVAL once if the script is not cached
+        self._sliding_window = redis_client.register_script(_SLIDING_WINDOW_LUA)
+        # key → _Window, least recently used first; bounded by LOCAL_CACHE_MAX_KEYS
+        self.local_cache: "OrderedDict[str, _Window]" = OrderedDict()
     
     async def is_allowed(self, 
                         key: str, 
@@ -36,23 +90,16 @@ class RateLimiter:
             return self._check_local_limit(key, limit, window_seconds, now)
     
     async def _check_redis_limit(self, key: str, limit: int, window_seconds: int, now: float) -> tuple[bool, Dict[str, int]]:
-        """Redis-based sliding window rate limiter"""
-        pipe = self.redis.pipeline()
+        """Redis-based sliding window rate limiter
         
-        # Remove expired entries
-        pipe.zremrangebyscore(f"rate_limit:{key}", 0, now - window_seconds)
-        
-        # Count current requests
-        pipe.zcard(f"rate_limit:{key}")
-        
-        # Add current request
-        pipe.zadd(f"rate_limit:{key}", {str(now): now})
-        
-        # Set expiry
-        pipe.expire(f"rate_limit:{key}", window_seconds + 1)
-        
-        results = await pipe.execute()
-        current_count = results[1]
+        A single server-side script keeps check-and-add atomic, so
+        concurrent callers cannot both take the last slot, and rejected
+        requests are not recorded.
+        """
+        current_count = await self._sliding_window(
+            keys=[f"rate_limit:{key}"],
+            args=[now, window_seconds, limit]
+        )
         
         is_allowed = current_count < limit
         remaining = max(0, limit - current_count - 1)
@@ -62,18 +109,23 @@ class RateLimiter:
     
     def _check_local_limit(self, key: str, limit: int, window_seconds: int, now: float) -> tuple[bool, Dict[str, int]]:
         """Local sliding window rate limiter"""
-        window = self.local_cache[key]
+        window = self.local_cache.get(key)
+        if window is None or len(window.times) != limit:
+            window = self.local_cache[key] = _Window(limit)
+            if len(self.local_cache) > LOCAL_CACHE_MAX_KEYS:
+                self.local_cache.popitem(last=False)
+        else:
+            self.local_cache.move_to_end(key)
         
         # Remove expired entries
-        while window and window[0] <= now - window_seconds:
-            window.popleft()
+        window.expire(now - window_seconds)
         
-        is_allowed = len(window) < limit
+        is_allowed = window.count < limit
         
         if is_allowed:
             window.append(now)
         
-        remaining = max(0, limit - len(window))
+        remaining = max(0, limit - window.count)
         reset_time = int(now + window_seconds)
         
         return is_allowed, {"remaining": remaining, "reset_time": reset_time}
\ No newline at end of file
@@ -12,6 +12,19 @@ REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "10"))
 REDIS_RETRY_ON_TIMEOUT = os.getenv("REDIS_RETRY_ON_TIMEOUT", "true").lower() == "true"
 REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", "30"))
 
+# Rule keys are kept as bytes end to end; the client is used with
+# decode_responses=False, so SCAN returns bytes and nothing is re-encoded
+RULE_KEY_PREFIX = b"rule:"
+RULE_KEY_PATTERN = RULE_KEY_PREFIX + b"*"
+
+# SCAN COUNT hint and MGET batch size for bulk rule loads
+RULE_SCAN_COUNT = 1000
+RULE_MGET_BATCH = 500
+
+def rule_redis_key(rule_id: str) -> bytes:
+    """Redis key for a rule id"""
+    return RULE_KEY_PREFIX + rule_id.encode("utf-8")
+
 # Global Redis connection pool
 _redis_pool: Optional[redis.ConnectionPool] = None
 _redis_client: Optional[redis.Redis] = None
@@ -24,6 +37,7 @@ async def init_redis_pool():
         _redis_pool = redis.ConnectionPool.from_url(
             REDIS_URL,
             max_connections=REDIS_MAX_CONNECTIONS,
+            decode_responses=False,
             retry_on_timeout=REDIS_RETRY_ON_TIMEOUT,
             health_check_interval=REDIS_HEALTH_CHECK_INTERVAL
         )
@@ -101,13 +115,24 @@ async def get_or_default(key: str, default: str = None):
     result = await redis.get(key)
     return result.decode() if result else default
 
+# SCAN COUNT hint and UNLINK batch size for delete_pattern
+DELETE_BATCH_SIZE = 1000
+
 async def delete_pattern(pattern: str) -> int:
-    """Delete keys matching pattern"""
+    """Delete keys matching pattern
+    
+    Keys are UNLINKed in batches as SCAN streams them, so memory stays
+    bounded and Redis frees the values off its main thread.
+    """
     redis = await get_redis()
-    keys = []
-    async for key in redis.scan_iter(match=pattern):
-        keys.append(key)
+    deleted = 0
+    batch = []
+    async for key in redis.scan_iter(match=pattern, count=DELETE_BATCH_SIZE):
+        batch.append(key)
+        if len(batch) >= DELETE_BATCH_SIZE:
+            deleted += await redis.unlink(*batch)
+            batch.clear()
     
-    if keys:
-        return await redis.delete(*keys)
-    return 0
+    if batch:
+        deleted += await redis.unlink(*batch)
+    return deleted
@@ -1,5 +1,9 @@
 # app/config.py
-from pydantic import BaseSettings, Field
+try:
+    from pydantic.v1 import BaseSettings, Field
+except ImportError:  # Pydantic <2
+    from pydantic import BaseSettings, Field
+from functools import lru_cache
 from typing import Optional, List
 import os
 
@@ -16,6 +20,8 @@ class KafkaSettings(BaseSettings):
     topic: str = Field(default="rules", env="KAFKA_TOPIC")
     group_id: str = Field(default="rule_engine", env="KAFKA_GROUP_ID")
     auto_offset_reset: str = Field(default="earliest", env="KAFKA_AUTO_OFFSET_RESET")
+    # Overrides service.log_level for the consumer's logger when set
+    log_level: Optional[str] = Field(default=None, env="KAFKA_LOG_LEVEL")
 
 class ServiceSettings(BaseSettings):
     """Service configuration"""
@@ -43,12 +49,12 @@ class Settings(BaseSettings):
     environment: str = Field(default="development", env="ENVIRONMENT")
     debug: bool = Field(default=False, env="DEBUG")
     
-    # Sub-configurations
-    redis: RedisSettings = RedisSettings()
-    kafka: KafkaSettings = KafkaSettings()
-    service: ServiceSettings = ServiceSettings()
-    security: SecuritySettings = SecuritySettings()
-    metrics: MetricsSettings = MetricsSettings()
+    # Sub-configurations, built per Settings instance rather than at import
+    redis: RedisSettings = Field(default_factory=RedisSettings)
+    kafka: KafkaSettings = Field(default_factory=KafkaSettings)
+    service: ServiceSettings = Field(default_factory=ServiceSettings)
+    security: SecuritySettings = Field(default_factory=SecuritySettings)
+    metrics: MetricsSettings = Field(default_factory=MetricsSettings)
     
     # CORS settings
     allowed_origins: List[str] = Field(
@@ -69,6 +75,12 @@ class Settings(BaseSettings):
         env_file = ".env"
         env_file_encoding = "utf-8"
         case_sensitive = False
+        frozen = True
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Process-wide settings; the environment is parsed once"""
+    return Settings()
 
 # Global settings instance
-settings = Settings()
\ No newline at end of file
+settings = get_settings()
@@ -5,17 +5,23 @@ Load sample rules into the Money Transfer Rules Engine
 
 import asyncio
 import json
-from typing import List
+from typing import List, Optional
 import sys
 import os
 
 # Add the app directory to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
-from app.models import RuleModel, RoutingRuleModel, FraudRuleModel, ComplianceRuleModel, BusinessRuleModel
-from app.redis_store import get_redis
+from app.models import (
+    RuleModel, RoutingRuleModel, FraudRuleModel, ComplianceRuleModel, BusinessRuleModel,
+    pydantic_to_proto_rule,
+)
+from app.redis_store import get_redis, rule_redis_key
 from app.engine import RuleEngine
 
+# Loaded once from Redis and reused by every evaluation below
+engine: Optional[RuleEngine] = None
+
 async def create_sample_rules() -> List[RuleModel]:
     """Create sample rules for testing"""
     rules = []
@@ -83,28 +89,37 @@ async def create_sample_rules() -> List[RuleModel]:
     
     return rules
 
+# Keys written per MSET; larger loads are split so a single command
+# never monopolizes the Redis server
+MSET_BATCH_SIZE = 10_000
+
 async def load_rules_to_redis(rules: List[RuleModel]):
-    """Load rules into Redis"""
+    """Load rules into Redis with one MSET per batch"""
     redis = await get_redis()
     
+    # Serialize everything up front, in the proto format the API, gRPC
+    # server and Kafka consumer all read back
+    payloads = [
+        (rule_redis_key(rule.id), pydantic_to_proto_rule(rule).SerializeToString())
+        for rule in rules
+    ]
+    
+    for start in range(0, len(payloads), MSET_BATCH_SIZE):
+        await redis.mset(dict(payloads[start:start + MSET_BATCH_SIZE]))
+    
     for rule in rules:
-        rule_key = f"rule:{rule.id}"
-        rule_data = rule.model_dump_json()
-        await redis.set(rule_key, rule_data)
         print(f"✅ Loaded rule: {rule.id}")
     
     print(f"\n🎉 Successfully loaded {len(rules)} rules to Redis!")
 
-async def test_engine_with_rules():
+async def test_engine_with_rules(rules: List[RuleModel]):
     """Test the engine with loaded rules"""
     from app.main import Context
+    global engine
     
-    # Create sample rules
-    rules = await create_sample_rules()
-    
-    # Load into engine
-    engine = RuleEngine()
-    engine.load(rules)
+    if engine is None:
+        # Read back what load_rules_to_redis wrote, through the real load path
+        engine = await RuleEngine.from_redis(await get_redis())
     
     # Test context
     ctx = Context(
@@ -121,20 +136,12 @@ async def test_engine_with_rules():
     print("\n🧪 Testing Rules Engine:")
     print(f"📊 Loaded {len(engine.rules)} rules")
     
-    # Test routing
-    route = engine.route(ctx)
-    print(f"🔀 Routing: {route}")
+    # All four rule types in one engine pass
+    route, fraud, compliance, business = engine.evaluate_all(ctx)
     
-    # Test fraud
-    fraud = engine.fraud(ctx)
+    print(f"🔀 Routing: {route}")
     print(f"🚨 Fraud: {fraud}")
-    
-    # Test compliance
-    compliance = engine.compliance(ctx)
     print(f"📋 Compliance: {compliance}")
-    
-    # Test business
-    business = engine.business(ctx)
     print(f"💼 Business: {business}")
 
 async def main():
@@ -149,7 +156,7 @@ async def main():
         await load_rules_to_redis(rules)
         
         # Test engine
-        await test_engine_with_rules()
+        await test_engine_with_rules(rules)
         
     except Exception as e:
         print(f"❌ Error: {e}")
@@ -0,0 +1,22 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.models import RuleModel
+
+    # The endpoints read the module-level engine that app.state.engine points at
+    engine = app.state.engine
+    r = RuleModel(id="R1", enabled=True,
+                  routing={"name":"lowIN","match":"amount<5000 and destination_country=='IN'",
+                           "methods":["CARD"],"processors":["GW_A","GW_B"],"priority":1,"weight":1})
+    engine.load([r])
+    # Not entered as a context manager: startup connects to Redis, Kafka and gRPC
+    return TestClient(app)
@@ -0,0 +1,33 @@
+from app.circuit_breaker import CircuitBreaker, CircuitBreakerConfig, CircuitState
+
+
+class _RecordingLogger:
+    def __init__(self):
+        self.events = []
+
+    def info(self, event, **kw):
+        self.events.append(event)
+
+    error = info
+
+
+def test_circuit_opens_once_past_threshold():
+    breaker = CircuitBreaker("t", CircuitBreakerConfig(failure_threshold=2))
+    breaker.logger = _RecordingLogger()
+
+    for _ in range(4):
+        breaker._on_failure(RuntimeError("boom"))
+
+    assert breaker.state is CircuitState.OPEN
+    assert breaker.logger.events == ["circuit_breaker_opened"]
+
+
+def test_failure_while_half_open_reopens():
+    breaker = CircuitBreaker("t", CircuitBreakerConfig(failure_threshold=1))
+    breaker.logger = _RecordingLogger()
+    breaker.state = CircuitState.HALF_OPEN
+
+    breaker._on_failure(RuntimeError("boom"))
+
+    assert breaker.state is CircuitState.OPEN
+    assert breaker.logger.events == ["circuit_breaker_opened"]
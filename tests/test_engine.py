@@ -0,0 +1,146 @@
+from app.engine import RuleEngine
+from app.models import RuleModel, RoutingRuleModel
+
+
+def _routing_rule(rule_id, priority, processors, match="amount > 0", methods=("CARD",)):
+    return RuleModel(
+        id=rule_id,
+        routing=RoutingRuleModel(
+            name=rule_id,
+            match=match,
+            methods=list(methods),
+            processors=processors,
+            priority=priority,
+        ),
+    )
+
+
+def test_route_prefers_lowest_priority_number():
+    engine = RuleEngine()
+    engine.load([
+        _routing_rule("low", 5, ["P_LOW"]),
+        _routing_rule("high", 1, ["P_HIGH"]),
+    ])
+
+    ctx = {"amount": 10, "method": "CARD"}
+    assert engine.route(ctx) == ["P_HIGH"]
+    assert engine.route(ctx, return_all=True) == ["P_HIGH", "P_LOW"]
+
+
+def test_route_filters_by_method():
+    engine = RuleEngine()
+    engine.load([_routing_rule("card", 1, ["P1"])])
+
+    assert engine.route({"amount": 10, "method": "CASH"}) is None
+
+
+def test_eval_cache_keys_on_referenced_values():
+    engine = RuleEngine()
+    engine.load([_routing_rule("r", 1, ["P1"], match="amount < 100 and daily_txn_count < 5")])
+
+    assert engine.route({"amount": 10, "daily_txn_count": 1}) == ["P1"]
+    assert engine.route({"amount": 10, "daily_txn_count": 9}) is None
+    assert engine.route({"amount": 10, "daily_txn_count": 1}) == ["P1"]
+
+
+def test_upsert_and_remove_single_rule():
+    engine = RuleEngine()
+    engine.load([_routing_rule("a", 5, ["P_A"])])
+
+    assert engine.upsert(_routing_rule("b", 1, ["P_B"]))
+    assert engine.route({"amount": 10, "method": "CARD"}) == ["P_B"]
+
+    assert engine.upsert(_routing_rule("b", 9, ["P_B"]))
+    assert engine.route({"amount": 10, "method": "CARD"}) == ["P_A"]
+    assert len(engine.rules) == 2
+
+    assert engine.remove("a")
+    assert not engine.remove("a")
+    assert engine.route({"amount": 10, "method": "CARD"}) == ["P_B"]
+
+
+def test_rule_counts_track_upsert_and_remove():
+    engine = RuleEngine()
+    engine.load([_routing_rule("a", 1, ["P_A"])])
+    engine.upsert(RuleModel(id="f", fraud={"name": "f", "expression": "amount > 1",
+                                          "score_weight": 1, "threshold": 1,
+                                          "action": "REVIEW"}))
+
+    assert engine.rule_counts() == {"total": 2, "routing": 1, "fraud": 1,
+                                    "compliance": 0, "business": 0, "enabled": 2}
+
+    engine.remove("a")
+    assert engine.rule_counts()["routing"] == 0
+    assert engine.rule_counts()["total"] == 1
+
+
+def test_evaluate_all_matches_individual_evaluators():
+    engine = RuleEngine()
+    engine.load([
+        _routing_rule("r", 1, ["P1"]),
+        RuleModel(id="b", business={"name": "b", "condition": "amount > 5",
+                                    "action": "tag"}),
+    ])
+    ctx = {"amount": 10, "method": "CARD"}
+
+    assert engine.evaluate_all(ctx) == (
+        engine.route(ctx), engine.fraud(ctx), engine.compliance(ctx), engine.business(ctx)
+    )
+
+
+class _MutatingCtx(dict):
+    """Context that runs a callback the first time a rule expression reads
+    "amount", i.e. while the engine is part-way through a rule list"""
+
+    def __init__(self, callback, **values):
+        super().__init__(**values)
+        self._callback = callback
+
+    def get(self, key, default=None):
+        if key == "amount" and self._callback is not None:
+            callback, self._callback = self._callback, None
+            callback()
+        return super().get(key, default)
+
+
+def _fraud_rule(rule_id):
+    return RuleModel(id=rule_id, fraud={"name": rule_id, "expression": "amount > 1",
+                                        "score_weight": 1, "threshold": 5,
+                                        "action": "REVIEW"})
+
+
+def test_remove_during_evaluation_keeps_snapshot():
+    engine = RuleEngine()
+    engine.load([_fraud_rule("f1"), _fraud_rule("f2")])
+
+    ctx = _MutatingCtx(lambda: engine.remove("f2"), amount=10)
+    result = engine.fraud(ctx)
+
+    # The in-flight evaluation finishes on the list it started with
+    assert [m["rule_id"] for m in result["matched_rules"]] == ["f1", "f2"]
+    assert engine.fraud({"amount": 10})["total_score"] == 1
+
+
+def test_upsert_during_evaluation_never_drops_rule():
+    engine = RuleEngine()
+    engine.load([_routing_rule("a", 1, ["P_A"])])
+    seen = []
+
+    def upsert_and_route():
+        engine.upsert(_routing_rule("a", 2, ["P_A2"]))
+        seen.append(engine.route({"amount": 10, "method": "CARD"}))
+
+    assert engine.route(_MutatingCtx(upsert_and_route, amount=10, method="CARD")) == ["P_A"]
+    assert seen == [["P_A2"]]
+
+
+def test_evaluation_errors_are_counted_as_failures():
+    engine = RuleEngine()
+    engine.load([_routing_rule("r", 1, ["P1"], match="missing_field > 0")])
+
+    assert engine.route({"amount": 10, "method": "CARD"}) is None
+    assert engine.route({"amount": 10, "method": "CARD"}) is None
+
+    metric = engine.get_metrics()["r"]
+    assert metric.failure_count == 2
+    assert metric.last_failure == "NameError"
@@ -0,0 +1,25 @@
+import pytest
+from app.eval_safe import _CODE_CACHE_SIZE, compile_expression, safe_eval
+
+
+def test_context_is_read_in_place():
+    ctx = {"amount": 10, "method": "CARD"}
+    assert safe_eval("amount < 100 and method == 'CARD'", ctx)
+    assert ctx == {"amount": 10, "method": "CARD"}
+
+
+@pytest.mark.parametrize("expr", [
+    "(amount := 1) > 0",
+    "__import__('os')",
+    "amount.real > 0",
+])
+def test_disallowed_nodes_rejected(expr):
+    with pytest.raises(ValueError):
+        safe_eval(expr, {"amount": 1})
+
+
+def test_compile_cache_is_bounded():
+    compile_expression.cache_clear()
+    for i in range(_CODE_CACHE_SIZE + 10):
+        compile_expression(f"amount > {i}")
+    assert compile_expression.cache_info().currsize == _CODE_CACHE_SIZE
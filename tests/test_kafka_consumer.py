@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+
+from app import kafka_consumer
+from app.engine import RuleEngine
+from app.models import RuleModel, RoutingRuleModel, pydantic_to_proto_rule
+
+
+class _Msg:
+    def __init__(self, value, partition, offset):
+        self._value, self._partition, self._offset = value, partition, offset
+
+    def topic(self):
+        return "rules"
+
+    def partition(self):
+        return self._partition
+
+    def offset(self):
+        return self._offset
+
+    def value(self):
+        return self._value
+
+
+class _StubConsumer:
+    def __init__(self):
+        self.commits = []
+
+    def commit(self, offsets, asynchronous):
+        self.commits.append(sorted((tp.partition, tp.offset) for tp in offsets))
+
+
+class _FlakyRedis:
+    """MSET fails the first `failures` times, then stores"""
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = 0
+        self.data = {}
+
+    async def mset(self, mapping):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise ConnectionError("redis unavailable")
+        self.data.update(mapping)
+
+
+def _payload(rule_id):
+    rule = RuleModel(id=rule_id, routing=RoutingRuleModel(
+        name=rule_id, match="amount > 0", methods=["CARD"], processors=["P1"], priority=1
+    ))
+    return pydantic_to_proto_rule(rule).SerializeToString()
+
+
+def test_failed_batch_is_retried_before_commit(monkeypatch):
+    pytest.importorskip("app.proto_gen.rules_pb2")
+    monkeypatch.setattr(kafka_consumer, "RETRY_BACKOFF_INITIAL", 0)
+
+    async def run():
+        engine, redis = RuleEngine(), _FlakyRedis(failures=2)
+        manager = kafka_consumer.KafkaConsumerManager(engine, redis)
+        manager.consumer = _StubConsumer()
+        for offset, rule_id in enumerate(["a", "b"]):
+            manager._queue.put_nowait(_Msg(_payload(rule_id), 0, offset))
+
+        task = asyncio.create_task(manager._processor_loop())
+        while not manager.consumer.commits:
+            await asyncio.sleep(0)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return engine, redis, manager.consumer
+
+    engine, redis, consumer = asyncio.run(run())
+
+    assert redis.calls == 3
+    assert sorted(redis.data) == [b"rule:a", b"rule:b"]
+    assert sorted(r.id for r in engine.rules) == ["a", "b"]
+    # Committed exactly once, after the retry succeeded
+    assert consumer.commits == [[(0, 2)]]
+
+
+class _IdleConsumer:
+    def __init__(self, conf):
+        self.closed = 0
+
+    def subscribe(self, topics):
+        pass
+
+    def consume(self, num_messages, timeout):
+        return []
+
+    def close(self):
+        self.closed += 1
+
+
+def test_cancelling_start_stops_the_consumer(monkeypatch):
+    monkeypatch.setattr(kafka_consumer, "Consumer", _IdleConsumer)
+
+    async def run():
+        manager = kafka_consumer.KafkaConsumerManager(RuleEngine(), _FlakyRedis(failures=0))
+        task = asyncio.create_task(manager.start())
+        while manager._processor_task is None:
+            await asyncio.sleep(0)
+        consumer, processor = manager.consumer, manager._processor_task
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        # A second stop() (e.g. from the module-level helper) is a no-op
+        await manager.stop()
+        return manager, consumer, processor
+
+    manager, consumer, processor = asyncio.run(run())
+
+    assert consumer.closed == 1
+    assert processor.cancelled()
+    assert manager.consumer is None and manager._processor_task is None
@@ -1,23 +1,24 @@
-import os
-import sys
+def test_route(client):
+    payload = {"txn_id":"1","destination_country":"IN","amount":4500,"method":"CARD","daily_txn_count":1}
+    res = client.post("/evaluate", json=payload)
+    assert res.status_code==200 and res.json()["processors"][0]=="GW_A"
+
 
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+def test_validation_error_matches_fastapi_body_errors(client):
+    payload = {"txn_id":"1","destination_country":"IN","amount":"lots","method":"CARD","daily_txn_count":1}
+    res = client.post("/evaluate", json=payload)
+    assert res.status_code==422
+    assert [err["loc"] for err in res.json()["detail"]]==[["body","amount"]]
 
-from app.engine import RuleEngine
-from app.models import RuleModel
-from fastapi.testclient import TestClient
-from app.main import app
 
-def setup_module(_):
-    engine = app.state._state["engine"] if hasattr(app.state,"_state") else RuleEngine()
-    r = RuleModel(id="R1", enabled=True,
-                  routing={"name":"lowIN","match":"amount<5000 and destination_country=='IN'",
-                           "methods":["CARD"],"processors":["GW_A","GW_B"],"priority":1,"weight":1})
-    engine.load([r]); app.state.engine = engine
+def test_malformed_json_matches_fastapi_decode_error(client):
+    res = client.post("/evaluate", content=b"{", headers={"content-type": "application/json"})
+    assert res.status_code==422
+    assert res.json()["detail"][0]["type"]=="json_invalid"
+    assert res.json()["detail"][0]["loc"]==["body", 1]
 
-client = TestClient(app)
 
-def test_route():
-    payload = {"txn_id":"1","destination_country":"IN","amount":4500,"method":"CARD","daily_txn_count":1}
-    res = client.post("/evaluate", json=payload)
-    assert res.status_code==200 and res.json()["processors"][0]=="GW_A"
+def test_non_json_body_is_rejected(client):
+    res = client.post("/evaluate", content=b'{"txn_id":"1"}', headers={"content-type": "text/plain"})
+    assert res.status_code==422
+    assert res.json()["detail"][0]["loc"]==["body"]
@@ -0,0 +1,74 @@
+import asyncio
+
+from prometheus_client import REGISTRY
+
+from app.metrics import instrument_http_endpoint, instrument_rule_execution
+
+
+def _sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_instrument_http_endpoint_picks_async_wrapper():
+    @instrument_http_endpoint("/test-async")
+    async def handler():
+        return "ok"
+
+    before = _sample("http_requests_total", method="POST", endpoint="/test-async", status_code="200")
+    assert asyncio.run(handler()) == "ok"
+    assert _sample("http_requests_total", method="POST", endpoint="/test-async",
+                   status_code="200") == before + 1
+
+
+def test_instrument_rule_execution_counts_errors_by_type():
+    @instrument_rule_execution("test_type")
+    def evaluate():
+        raise ValueError("boom")
+
+    before = _sample("rule_evaluations_total", rule_type="test_type", status="error")
+    try:
+        evaluate()
+    except ValueError:
+        pass
+    assert _sample("rule_evaluations_total", rule_type="test_type", status="error") == before + 1
+
+
+def test_setup_service_info_reports_runtime_values():
+    import sys
+    from app.metrics import MetricsCollector, setup_service_info
+
+    MetricsCollector()
+    MetricsCollector()
+    setup_service_info("staging")
+
+    version = "%d.%d.%d" % sys.version_info[:3]
+    assert REGISTRY.get_sample_value(
+        "service_info_info",
+        {"version": "1.0.0", "python_version": version, "environment": "staging"},
+    ) == 1.0
+
+
+def test_flusher_queues_observations_until_flush():
+    from app.metrics import MetricsCollector
+
+    collector = MetricsCollector()
+
+    def success_count():
+        return _sample("rule_evaluations_total", rule_type="flushed", status="success")
+
+    async def run():
+        collector.start_flusher()
+        before = success_count()
+        for _ in range(3):
+            with collector.time_rule_execution("flushed", "r1"):
+                pass
+        queued = success_count()
+        collector.flush()
+        flushed = success_count()
+        await collector.stop_flusher()
+        return before, queued, flushed
+
+    before, queued, flushed = asyncio.run(run())
+    assert queued == before
+    assert flushed == before + 3
+    assert _sample("rule_execution_duration_seconds_count", rule_type="flushed") == 3
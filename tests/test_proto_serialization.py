@@ -22,3 +22,36 @@ def test_proto_round_trip():
 
     assert restored.id == rule.id
     assert restored.routing.name == rule.routing.name
+
+
+def test_proto_round_trip_keeps_last_modified():
+    pytest.importorskip("app.proto_gen.rules_pb2")
+    from datetime import datetime
+
+    stamp = datetime(2024, 1, 2, 3, 4, 5)
+    rule = RuleModel(
+        id="lm",
+        last_modified=stamp,
+        routing=RoutingRuleModel(
+            name="basic", match="amount > 0", methods=["CARD"], processors=["P1"], priority=1
+        ),
+    )
+
+    assert rule.last_modified == stamp
+    assert proto_to_pydantic_rule(pydantic_to_proto_rule(rule)).last_modified == stamp
+
+
+def test_unset_last_modified_decodes_as_now():
+    pytest.importorskip("app.proto_gen.rules_pb2")
+    from datetime import datetime, timedelta
+
+    proto = pydantic_to_proto_rule(RuleModel(
+        id="k",
+        routing=RoutingRuleModel(
+            name="basic", match="amount > 0", methods=["CARD"], processors=["P1"], priority=1
+        ),
+    ))
+    proto.ClearField("last_modified")
+
+    restored = proto_to_pydantic_rule(proto)
+    assert datetime.now() - restored.last_modified < timedelta(seconds=5)